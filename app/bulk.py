@@ -0,0 +1,100 @@
+from os import environ
+
+import orjson
+from fastapi import HTTPException, Request
+from pydantic import ValidationError, conint, parse_obj_as
+
+from .models import PokemonModel
+
+
+# Documents sent to the database in each insert_many/delete_many
+BULK_CHUNK_SIZE = int(environ.get("BULK_CHUNK_SIZE", 500))
+
+PokedexId = conint(gt=0, le=809)
+
+
+# Placeholder for an NDJSON line that is not valid JSON
+class InvalidItem():
+    def __init__(self, detail):
+        self.detail = detail
+
+
+def new_pokemon(pokemon: PokemonModel):
+    # The document jsonable_encoder used to build, '_id' included as a string
+    document = pokemon.dict(by_alias=True)
+    document["_id"] = str(document["_id"])
+    document["name"] = document["name"].title()
+
+    return document
+
+
+async def read_items(request: Request):
+    # NDJSON bodies are parsed line by line as they arrive, JSON bodies must be an array
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+
+            for line in lines:
+                if line.strip():
+                    yield parse_line(line)
+
+        if buffer.strip():
+            yield parse_line(buffer)
+
+        return
+
+    try:
+        items = orjson.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    if type(items) is not list:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+
+    for item in items:
+        yield item
+
+
+def parse_line(line):
+    try:
+        return orjson.loads(line)
+    except ValueError:
+        return InvalidItem("Invalid JSON line")
+
+
+async def chunks(items, size=BULK_CHUNK_SIZE):
+    chunk = []
+    index = 0
+
+    async for item in items:
+        chunk.append((index, item))
+        index += 1
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def validate(item, model):
+    if isinstance(item, InvalidItem):
+        return None, item.detail
+
+    try:
+        return parse_obj_as(model, item), None
+    except ValidationError as error:
+        return None, error.errors()
+
+
+def summary(results):
+    results.sort(key=lambda result: result["index"])
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    return {**counts, "results": results}
@@ -0,0 +1,130 @@
+import json
+import time
+from collections import OrderedDict
+from os import environ
+
+
+# Returned by Cache.get when a key is not cached, since None is a valid value
+MISSING = object()
+
+
+# Bounded LRU cache with a TTL per entry. Every entry carries a set of tags,
+# so writes can drop exactly the entries built from the documents they touched.
+# Each invalidation bumps the generation, so a value loaded while a write
+# happened can be left out instead of cached.
+class Cache():
+    def __init__(self, max_size=2048, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return MISSING
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, tags):
+        if key in self.entries:
+            self._drop(key)
+
+        self.entries[key] = (value, time.monotonic() + self.ttl, tags)
+
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+        while len(self.entries) > self.max_size:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags):
+        self.generation += 1
+
+        for tag in tags:
+            for key in self.tags.get(tag, set()).copy():
+                self._drop(key)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
+        self.tags.clear()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _drop(self, key):
+        _, _, tags = self.entries.pop(key)
+
+        for tag in tags:
+            keys = self.tags.get(tag)
+            keys.discard(key)
+
+            if not keys:
+                del self.tags[tag]
+
+
+def identifier_key(id):
+    # '25', '025' and 25 are the same pokemon, as are 'pikachu' and 'Pikachu'
+    if str(id).isdigit():
+        return int(id)
+
+    return id.lower()
+
+
+def projection_key(projection):
+    return json.dumps(projection, sort_keys=True)
+
+
+def lookup_tags(id, document):
+    # Entries looked up by name are bound to their pokedex_id when it is known,
+    # the ones that are not ('unbound') are dropped by every update and removal
+    id = identifier_key(id)
+
+    if type(id) is int:
+        return {("id", id)}
+
+    if document is not None and "pokedex_id" in document:
+        return {("name", id), ("id", document["pokedex_id"])}
+
+    if document is not None:
+        return {("name", id), "unbound"}
+
+    return {("name", id)}
+
+
+def page_tags(pokemons):
+    return {"pages"} | {("id", pokemon["pokedex_id"]) for pokemon in pokemons if "pokedex_id" in pokemon}
+
+
+def listing_tags(pokemons):
+    # Any update can move a pokemon in or out of a filtered or sorted page
+    return page_tags(pokemons) | {"listings"}
+
+
+if environ.get("CACHE_ENABLED", "true").lower() == "true":
+    cache = Cache(int(environ.get("CACHE_MAX_SIZE", 2048)), float(environ.get("CACHE_TTL", 60)))
+else:
+    cache = None
+
+
+def get_cache():
+    return cache
@@ -0,0 +1,129 @@
+import zlib
+from os import environ
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+
+# Responses smaller than this are sent as they are
+COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(environ.get("BROTLI_QUALITY", 4))
+
+
+class GzipCompressor():
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, last):
+        # Chunks before the last one are flushed, so the client can decode them as they arrive
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor():
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, last):
+        return self.compressor.process(data) + (self.compressor.finish() if last else self.compressor.flush())
+
+
+def accepted_encoding(header):
+    # Brotli is preferred, encodings with q=0 were refused by the client
+    encodings = set()
+
+    for part in header.lower().split(","):
+        encoding, _, parameters = part.partition(";")
+
+        if parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(encoding.strip())
+
+    for encoding in ("br", "gzip"):
+        if encoding in encodings:
+            return encoding
+
+    return None
+
+
+# Compresses responses with brotli or gzip, following the Accept-Encoding of
+# the request. Streamed responses are compressed as their chunks go out.
+class CompressionMiddleware():
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=GZIP_LEVEL,
+            brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", "")) \
+            if scope["type"] == "http" else None
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        if encoding == "br":
+            compressor = BrotliCompressor(self.brotli_quality)
+        else:
+            compressor = GzipCompressor(self.gzip_level)
+
+        await CompressionResponder(self.app, encoding, compressor, self.minimum_size)(scope, receive, send)
+
+
+class CompressionResponder():
+    def __init__(self, app, encoding, compressor, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressing = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body shows whether it is worth compressing
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            self.compressing = "content-encoding" not in headers and (more_body or len(body) >= self.minimum_size)
+
+            if self.compressing:
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                del headers["Content-Length"]
+
+                # Each encoding is a different representation, with its own strong ETag
+                if headers.get("etag", "").startswith('"'):
+                    headers["ETag"] = f'{headers["etag"][:-1]}-{self.encoding}"'
+
+                if not more_body:
+                    body = self.compressor.compress(body, True)
+                    headers["Content-Length"] = str(len(body))
+                    await self.send(self.start)
+                    await self.send({**message, "body": body})
+                    return
+
+            await self.send(self.start)
+
+        if self.compressing:
+            # Empty chunks would only add empty frames to the stream
+            if not body and more_body:
+                return
+
+            message = {**message, "body": self.compressor.compress(body, not more_body)}
+
+        await self.send(message)
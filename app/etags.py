@@ -0,0 +1,64 @@
+from hashlib import blake2b
+from os import environ
+from secrets import token_hex
+
+from fastapi.responses import Response
+
+from .responses import wants_msgpack
+
+
+HTTP_CACHE_MAX_AGE = int(environ.get("HTTP_CACHE_MAX_AGE", 60))
+
+# Added to the ETags of compressed responses by the CompressionMiddleware
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+# The in-memory indexes count their changes from zero in each process, the
+# token keeps the counts of different processes (and restarts) apart
+PROCESS_TOKEN = token_hex(4)
+
+
+def etag(request, version):
+    # Strong validator of one representation: the version of the data it
+    # shows, plus the url and format that shaped its body
+    variant = f"{request.url.path}?{request.url.query}|{wants_msgpack.get()}"
+    return f'"{version}-{blake2b(variant.encode(), digest_size=8).hexdigest()}"'
+
+
+def generation_version(generation):
+    return f"{PROCESS_TOKEN}.{generation}"
+
+
+def cache_headers(tag):
+    return {"ETag": tag, "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}"}
+
+
+def matching_etag(request, tag):
+    # The validator in If-None-Match that matches 'tag', compared weakly as the RFC asks
+    for candidate in request.headers.get("if-none-match", "").split(","):
+        candidate = candidate.strip()
+
+        if candidate == "*":
+            return tag
+
+        value = candidate[2:] if candidate.startswith("W/") else candidate
+
+        for suffix in ENCODING_SUFFIXES:
+            if value.endswith(suffix + '"'):
+                value = value[:-len(suffix) - 1] + '"'
+
+        if value == tag:
+            return candidate
+
+    return None
+
+
+def not_modified(request, version):
+    # 304 for a client that already has this version, None otherwise
+    tag = etag(request, version)
+    matched = matching_etag(request, tag)
+
+    if matched is None:
+        return None
+
+    # Sent back as the client has it, compressed responses carry a suffix
+    return Response(status_code=304, headers=cache_headers(matched))
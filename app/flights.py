@@ -0,0 +1,49 @@
+import asyncio
+from os import environ
+
+
+# Identical lookups running at the same time share a single database call: the
+# first one (the leader) starts it, the others wait for its result. A write bumps
+# the generation, so lookups started after it never join a call that may have
+# read the document before it changed.
+class SingleFlight():
+    def __init__(self):
+        self.calls = {}
+        self.generation = 0
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key, load):
+        key = (self.generation, key)
+        call = self.calls.get(key)
+
+        if call is None:
+            # A task, so a leader cancelled by its client doesn't cancel the call for the others
+            call = asyncio.ensure_future(load())
+            call.add_done_callback(lambda _: self.calls.pop(key, None))
+            self.calls[key] = call
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+
+        return await asyncio.shield(call)
+
+    def invalidate(self):
+        self.generation += 1
+
+    def stats(self):
+        return {
+            "in_flight": len(self.calls),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+        }
+
+
+if environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true":
+    flights = SingleFlight()
+else:
+    flights = None
+
+
+def get_flights():
+    return flights
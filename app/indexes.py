@@ -0,0 +1,76 @@
+import sys
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, IndexModel
+from pymongo.collation import Collation
+
+from . import database
+
+
+# Case-insensitive comparison, used by the name index and by name lookups
+NAME_COLLATION = Collation(locale="en", strength=2)
+
+# Indexes expected on each collection, created idempotently on startup
+INDEXES = {
+    "pokemons": [
+        IndexModel([("pokedex_id", ASCENDING)], name="pokedex_id", unique=True),
+        IndexModel([("name", ASCENDING)], name="name", unique=True, collation=NAME_COLLATION),
+        IndexModel([("types", ASCENDING)], name="types"),
+        IndexModel([("moveset", ASCENDING)], name="moveset"),
+        IndexModel([("moveset_size", ASCENDING), ("pokedex_id", ASCENDING)], name="moveset_size"),
+        IndexModel([("version", ASCENDING)], name="version"),
+    ],
+    "moves": [
+        IndexModel([("move_id", ASCENDING)], name="move_id", unique=True),
+        IndexModel([("name", ASCENDING), ("power", ASCENDING), ("accuracy", ASCENDING), ("type", ASCENDING)],
+            name="move", unique=True),
+        # Covers the lookup of the moves of the min_power filter
+        IndexModel([("power", ASCENDING), ("move_id", ASCENDING)], name="power"),
+    ],
+}
+
+
+def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        db[collection].create_indexes(indexes)
+
+
+async def ensure_indexes_async(db):
+    for collection, indexes in INDEXES.items():
+        await db[collection].create_indexes(indexes)
+
+
+def index_stats(db):
+    stats = []
+
+    for collection in INDEXES:
+        for index in db[collection].aggregate([{"$indexStats": {}}]):
+            stats.append({
+                "collection": collection,
+                "name": index["name"],
+                "key": dict(index["key"]),
+                "ops": index["accesses"]["ops"],
+                "since": index["accesses"]["since"],
+            })
+
+    return stats
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    db = database.get_database()
+
+    if command == "ensure":
+        ensure_indexes(db)
+        print("Indices criados com sucesso!")
+
+    elif command == "stats":
+        for index in index_stats(db):
+            print(f"{index['collection']}.{index['name']}: {index['ops']} usos desde {index['since']:%Y-%m-%d %H:%M:%S}")
+
+    else:
+        print(f"Comando desconhecido: {command}. Use 'ensure' ou 'stats'.")
+
+    database.close()
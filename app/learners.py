@@ -0,0 +1,88 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+# Inverted index from each move name to the sorted pokedex_ids of the pokemons
+# that learn it. Kept up to date by the repository writes and rebuilt in bulk
+# from the database on startup (or on the first query).
+class LearnersIndex():
+    def __init__(self):
+        self.learners = {}
+        self.moves = {}
+        self.names = {}
+        self.loaded = False
+        # Bumped by every change, the ETags of the responses built from the index
+        self.generation = 0
+
+    def load(self, pokemons):
+        learners, moves, names = {}, {}, {}
+
+        for pokemon in pokemons:
+            pokedex_id = pokemon["pokedex_id"]
+            moves[pokedex_id] = move_names(pokemon)
+            names[pokedex_id] = pokemon["name"]
+
+            for name in moves[pokedex_id]:
+                learners.setdefault(name, []).append(pokedex_id)
+
+        for ids in learners.values():
+            ids.sort()
+
+        self.learners, self.moves, self.names = learners, moves, names
+        self.loaded = True
+        self.generation += 1
+
+    def put(self, pokemon):
+        pokedex_id = pokemon["pokedex_id"]
+        self.remove(pokedex_id)
+        self.generation += 1
+
+        self.moves[pokedex_id] = move_names(pokemon)
+        self.names[pokedex_id] = pokemon["name"]
+
+        for name in self.moves[pokedex_id]:
+            insort(self.learners.setdefault(name, []), pokedex_id)
+
+    def remove(self, pokedex_id):
+        self.generation += 1
+
+        for name in self.moves.pop(pokedex_id, ()):
+            ids = self.learners[name]
+            del ids[bisect_left(ids, pokedex_id)]
+
+            if not ids:
+                del self.learners[name]
+
+        self.names.pop(pokedex_id, None)
+
+    def find(self, moves, after, limit):
+        # Pokemons that learn every one of the moves, None when the first move is unknown
+        if moves[0].lower() not in self.learners:
+            return None
+
+        lists = [self.learners.get(name.lower(), []) for name in moves]
+
+        smallest = min(lists, key=len)
+        others = [set(ids) for ids in lists if ids is not smallest]
+
+        start = bisect_right(smallest, after) if after is not None else 0
+        found = []
+
+        for pokedex_id in smallest[start:]:
+            if all(pokedex_id in ids for ids in others):
+                found.append({"pokedex_id": pokedex_id, "name": self.names[pokedex_id]})
+
+                if len(found) == limit:
+                    break
+
+        return found
+
+
+def move_names(pokemon):
+    return {move["name"].lower() for move in pokemon.get("moveset") or []}
+
+
+learners = LearnersIndex()
+
+
+def get_learners():
+    return learners
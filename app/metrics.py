@@ -0,0 +1,257 @@
+import asyncio
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from os import environ
+
+import orjson
+from pymongo import monitoring
+
+
+METRICS_ENABLED = environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Type and help of each metric, in the order they are exposed
+METRICS = {
+    "http_requests_total": ("counter", "Requests served, by route template and status"),
+    "http_request_duration_seconds": ("histogram", "Time to serve a request, by route template"),
+    "http_response_size_bytes": ("histogram", "Body size of the responses as sent, by route template"),
+    "repository_query_duration_seconds": ("histogram", "Database round-trip time, by repository method and command"),
+    "repository_query_errors_total": ("counter", "Database commands that failed, by repository method and command"),
+    "repository_documents_total": ("counter", "Documents returned by the database, by repository method"),
+    "repository_decoded_bytes_total": ("counter", "Size of the documents returned by the database, measured as JSON"),
+}
+
+# Repository method running the database commands, read by the QueryListener and the SlowQueryLog.
+# Motor copies the context into the thread that runs each command.
+operation = ContextVar("operation", default=None)
+
+
+# Counters and histograms kept in one shard per thread, so recording never waits on
+# a lock: the event loop and the threads running database commands each write
+# their own shard, and the shards are only merged when the metrics are scraped.
+class Metrics():
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        shard = self._shard()
+        key = (name, labels, buckets)
+        histogram = shard.get(key)
+
+        if histogram is None:
+            # A count per bucket, then the +Inf bucket, then the sum
+            histogram = shard[key] = [0] * (len(buckets) + 2)
+
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def collect(self):
+        values = {}
+
+        for shard in list(self.shards):
+            for key, value in list(shard.items()):
+                if len(key) == 2:
+                    values[key] = values.get(key, 0) + value
+                else:
+                    merged = values.setdefault(key, [0] * len(value))
+                    for i, count in enumerate(value):
+                        merged[i] += count
+
+        return values
+
+    def render(self, extra=()):
+        # Text exposition format, 'extra' holds (name, type, help, value) of metrics kept elsewhere
+        families = {name: [] for name in METRICS}
+
+        for key, value in sorted(self.collect().items(), key=lambda item: item[0][:2]):
+            families[key[0]] += exposition(key, value)
+
+        lines = []
+
+        for name, samples in families.items():
+            kind, help = METRICS[name]
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", *samples]
+
+        for name, kind, help, value in extra:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for shard in list(self.shards):
+            shard.clear()
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+
+        if shard is None:
+            shard = self.local.shard = {}
+
+            with self.lock:
+                self.shards.append(shard)
+
+        return shard
+
+
+def exposition(key, value):
+    if len(key) == 2:
+        name, labels = key
+        return [f"{name}{label_set(labels)} {value}"]
+
+    name, labels, buckets = key
+    samples = []
+    count = 0
+
+    for bucket, observed in zip((*buckets, "+Inf"), value):
+        count += observed
+        samples.append(f"{name}_bucket{label_set(labels + (('le', bucket),))} {count}")
+
+    return samples + [f"{name}_sum{label_set(labels)} {value[-1]}", f"{name}_count{label_set(labels)} {count}"]
+
+
+def label_set(labels):
+    if not labels:
+        return ""
+
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def measured(function):
+    # Attributes the database commands run by a repository method to it
+    name = function.__name__
+
+    if asyncio.iscoroutinefunction(function):
+        @wraps(function)
+        async def wrapper(*args, **kwargs):
+            token = operation.set(name)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                operation.reset(token)
+
+        return wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        token = operation.set(name)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            operation.reset(token)
+
+    return wrapper
+
+
+def measured_methods(cls):
+    # Generators are left out, their commands run after the method has returned
+    for name, function in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(function) \
+                and not inspect.isgeneratorfunction(function) and not inspect.isasyncgenfunction(function):
+            setattr(cls, name, measured(function))
+
+    return cls
+
+
+def reply_documents(reply):
+    cursor = reply.get("cursor")
+
+    if cursor is not None:
+        return cursor.get("firstBatch") or cursor.get("nextBatch") or []
+
+    if "values" in reply:
+        return reply["values"]
+
+    if reply.get("value") is not None:
+        return [reply["value"]]
+
+    return []
+
+
+# Records the round-trip time and the documents of every command sent by the clients
+class QueryListener(monitoring.CommandListener):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        labels = (("method", operation.get() or "other"), ("command", event.command_name))
+        self.metrics.observe("repository_query_duration_seconds", labels, event.duration_micros / 1e6,
+            LATENCY_BUCKETS)
+
+        documents = reply_documents(event.reply)
+
+        if documents:
+            # The decoded reply is no longer BSON, its JSON size is the cheapest measure left
+            self.metrics.inc("repository_documents_total", labels[:1], len(documents))
+            self.metrics.inc("repository_decoded_bytes_total", labels[:1],
+                len(orjson.dumps(documents, default=str)))
+
+    def failed(self, event):
+        labels = (("method", operation.get() or "other"), ("command", event.command_name))
+        self.metrics.observe("repository_query_duration_seconds", labels, event.duration_micros / 1e6,
+            LATENCY_BUCKETS)
+        self.metrics.inc("repository_query_errors_total", labels)
+
+
+# Counts, latency and size of the responses, by the template of the route that
+# served them ('/pokemons/{id}'), so the labels stay few whatever the urls are.
+# Added outside the compression, it measures the bodies as they are sent.
+class MetricsMiddleware():
+    def __init__(self, app, metrics=None):
+        self.app = app
+        self.metrics = metrics if metrics is not None else get_metrics()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_measured(message):
+            nonlocal status, size
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            # The router leaves the route it matched in the scope
+            route = scope.get("route")
+            labels = (("method", scope["method"]), ("route", route.path if route is not None else "unmatched"))
+
+            self.metrics.inc("http_requests_total", labels + (("status", status),))
+            self.metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - start,
+                LATENCY_BUCKETS)
+            self.metrics.observe("http_response_size_bytes", labels, size, SIZE_BUCKETS)
+
+
+metrics = Metrics()
+query_listener = QueryListener(metrics)
+
+
+def get_metrics():
+    return metrics
@@ -0,0 +1,38 @@
+from dotenv import load_dotenv
+
+from . import database, indexes
+from .models import UpdatePokemonModel
+from .moves import get_move_catalog
+from .repositories.pokemon_repository import PokemonRepository
+
+
+# Moves the moves embedded in every moveset to the 'moves' collection, leaving
+# only their move_id behind, and stores the size of every moveset. Pokemons
+# already migrated are skipped, so it can run again safely.
+
+
+def migrate(db):
+    indexes.ensure_indexes(db)
+    repository = PokemonRepository(db, get_move_catalog())
+
+    migrated = 0
+    for pokemon in db["pokemons"].find({"moveset.name": {"$exists": True}}, {"pokedex_id": True, "moveset": True}):
+        repository.update(UpdatePokemonModel(moveset=pokemon["moveset"]), pokemon["pokedex_id"])
+        migrated += 1
+
+    # Pokemons created before moveset_size existed, needed to filter and sort on moveset sizes
+    db["pokemons"].update_many({"moveset_size": {"$exists": False}},
+        [{"$set": {"moveset_size": {"$size": {"$ifNull": ["$moveset", []]}}}}])
+
+    # Replaced by the index on the move_ids
+    if "moveset_name" in db["pokemons"].index_information():
+        db["pokemons"].drop_index("moveset_name")
+
+    return migrated
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    print(f"{migrate(database.get_database())} pokemons migrados com sucesso!")
+    database.close()
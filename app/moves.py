@@ -0,0 +1,54 @@
+MOVE_FIELDS = ("name", "power", "accuracy", "type")
+
+
+def move_data(move):
+    return {field: move.get(field) for field in MOVE_FIELDS}
+
+
+def move_key(move):
+    return tuple(move.get(field) for field in MOVE_FIELDS)
+
+
+# Moves are stored once in the 'moves' collection and movesets only keep their
+# move_id. Every known move is kept here to turn movesets back into moves on reads.
+class MoveCatalog():
+    def __init__(self):
+        self.by_id = {}
+        self.by_key = {}
+
+    def load(self, moves):
+        for move in moves:
+            self.add(move)
+
+    def add(self, move):
+        data = move_data(move)
+
+        self.by_id[move["move_id"]] = data
+        self.by_key[move_key(data)] = move["move_id"]
+
+    def unknown_moves(self, moves):
+        unknown = {}
+
+        for move in moves:
+            if type(move) is dict and move_key(move) not in self.by_key:
+                unknown[move_key(move)] = move_data(move)
+
+        return list(unknown.values())
+
+    def unknown_ids(self, ids):
+        return list({id for id in ids if type(id) is int and id not in self.by_id})
+
+    def refs(self, moveset):
+        return [self.by_key[move_key(move)] if type(move) is dict else move for move in moveset]
+
+    def expand(self, moveset):
+        # Movesets that were not migrated yet still hold the moves themselves
+        return [self.by_id[move] if type(move) is int else move
+            for move in moveset if type(move) is not int or move in self.by_id]
+
+
+catalog = MoveCatalog()
+
+
+def get_move_catalog():
+    return catalog
@@ -0,0 +1,125 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+
+# Sorted (lowercase name, pokedex_id) pairs: the names starting with a prefix are
+# a contiguous slice, found with bisect. Kept up to date by the repository writes
+# and rebuilt in bulk from the database on startup (or on the first query).
+class NameIndex():
+    def __init__(self):
+        self.entries = []
+        self.names = {}
+        self.loaded = False
+        # Bumped by every change, the ETags of the responses built from the index
+        self.generation = 0
+
+    def load(self, pokemons):
+        names = {pokemon["pokedex_id"]: pokemon["name"] for pokemon in pokemons}
+
+        self.entries = sorted((name.lower(), pokedex_id) for pokedex_id, name in names.items())
+        self.names = names
+        self.loaded = True
+        self.generation += 1
+
+    def put(self, pokemon):
+        self.remove(pokemon["pokedex_id"])
+        self.generation += 1
+
+        self.names[pokemon["pokedex_id"]] = pokemon["name"]
+        insort(self.entries, (pokemon["name"].lower(), pokemon["pokedex_id"]))
+
+    def remove(self, pokedex_id):
+        name = self.names.pop(pokedex_id, None)
+        self.generation += 1
+
+        if name is not None:
+            del self.entries[bisect_left(self.entries, (name.lower(), pokedex_id))]
+
+    def suggest(self, prefix, limit):
+        prefix = prefix.lower()
+        start = bisect_left(self.entries, (prefix,))
+        found = []
+
+        for name, pokedex_id in self.entries[start : start + limit]:
+            if not name.startswith(prefix):
+                break
+
+            found.append({"pokedex_id": pokedex_id, "name": self.names[pokedex_id]})
+
+        return found
+
+    def complete(self, prefix, limit, fuzzy=False, max_distance=2):
+        found = self.suggest(prefix, limit)
+
+        # Typos only matter when the prefix alone doesn't fill the page
+        if fuzzy and len(found) < limit:
+            ids = {pokemon["pokedex_id"] for pokemon in found}
+            found += [pokemon for pokemon in self.fuzzy(prefix, limit, max_distance)
+                if pokemon["pokedex_id"] not in ids][:limit - len(found)]
+
+        return found
+
+    def fuzzy(self, query, limit, max_distance):
+        # Names that start within max_distance edits of the query, closest first.
+        # The sorted names are walked like a trie: each name reuses the rows of the
+        # edit distance table computed for the prefix it shares with the previous
+        # one, and stops at the first prefix already too far from the query.
+        query = query.lower()
+        rows = [list(range(len(query) + 1))]
+        previous = ""
+        scored = []
+        index = 0
+
+        while index < len(self.entries):
+            name = self.entries[index][0][:len(query) + max_distance]
+            del rows[min(shared_prefix(previous, name), len(rows) - 1) + 1:]
+            previous = name
+            end = index + 1
+
+            for char in name[len(rows) - 1:]:
+                row = next_row(rows[-1], char, query)
+
+                if min(row) > max_distance:
+                    # Every name starting with this prefix ends up with the same distance
+                    end = bisect_left(self.entries, (name[:len(rows)] + "\uffff",), end)
+                    break
+
+                rows.append(row)
+
+            distance = min(row[-1] for row in rows)
+
+            if distance <= max_distance:
+                scored += [(distance, entry) for entry in self.entries[index:end]]
+
+            index = end
+
+        return [{"pokedex_id": pokedex_id, "name": self.names[pokedex_id]}
+            for _, (_, pokedex_id) in nsmallest(limit, scored)]
+
+
+def shared_prefix(first, second):
+    length = 0
+
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+
+    return length
+
+
+def next_row(row, char, query):
+    # Edit distances between the name prefix ending in 'char' and each prefix of the query
+    current = [row[0] + 1]
+
+    for i, other in enumerate(query, 1):
+        current.append(min(row[i] + 1, current[i - 1] + 1, row[i - 1] + (char != other)))
+
+    return current
+
+
+names = NameIndex()
+
+
+def get_names():
+    return names
@@ -0,0 +1,33 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from os import environ
+
+
+# Upper bound for the 'limit' parameter of paginated routes
+MAX_PAGE_SIZE = int(environ.get("MAX_PAGE_SIZE", 1000))
+
+
+# Cursors are opaque to clients, but only wrap the last pokedex_id of a page
+def encode_cursor(pokedex_id):
+    data = json.dumps({"pokedex_id": pokedex_id}).encode()
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        pokedex_id = data["pokedex_id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Invalid cursor {cursor}")
+
+    if type(pokedex_id) is not int:
+        raise ValueError(f"Invalid cursor {cursor}")
+
+    return pokedex_id
+
+
+def next_cursor(pokemons, limit):
+    if len(pokemons) < limit:
+        return None
+
+    return encode_cursor(pokemons[-1]["pokedex_id"])
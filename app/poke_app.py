@@ -1,14 +1,107 @@
-from typing import Optional
+from os import environ
+from typing import List, Optional
+
+import orjson
+from fastapi import FastAPI, HTTPException, Body, Path, Query, Depends, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import conlist, constr
+
+from . import database, indexes
+from .bulk import PokedexId, read_items, chunks, validate, new_pokemon, summary
+from .cache import Cache, get_cache
+from .compression import CompressionMiddleware
+from .etags import etag, cache_headers, generation_version, not_modified
+from .flights import SingleFlight, get_flights
+from .learners import get_learners
+from .metrics import METRICS_ENABLED, Metrics, MetricsMiddleware, get_metrics
+from .moves import get_move_catalog
+from .names import get_names
+from .replica import get_replica
+from .slow_queries import SlowQueryLog, get_slow_queries
+from .responses import FastJSONResponse, NegotiatedRoute, default
+from .repositories.async_pokemon_repository import AsyncPokemonRepository
+from .repositories.memory_pokemon_repository import MemoryPokemonRepository, get_memory_store, read_snapshot
+from .models import PokemonModel, UpdatePokemonModel
+from .pagination import MAX_PAGE_SIZE, decode_cursor, next_cursor
+from .repositories.queries import SORT_FIELDS, PokemonFilter, type_filter, fields_projection
 
-from fastapi import FastAPI, HTTPException, Body, Path, Query, Depends
-from fastapi.encoders import jsonable_encoder
 
-from .repositories.pokemon_repository import PokemonRepository
-from .models import PokemonModel, UpdatePokemonModel
+EXPORT_BATCH_SIZE = int(environ.get("EXPORT_BATCH_SIZE", 100))
+
+# 'mongo', or 'memory' to keep the pokedex only in memory, loaded from MEMORY_SNAPSHOT when set
+STORAGE_BACKEND = environ.get("STORAGE_BACKEND", "mongo")
+MEMORY_SNAPSHOT = environ.get("MEMORY_SNAPSHOT")
 
 
 # App and Database
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+app.router.route_class = NegotiatedRoute
+app.add_middleware(CompressionMiddleware)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# The routes depend on AsyncPokemonRepository, other backends take its place
+if STORAGE_BACKEND == "memory":
+    app.dependency_overrides[AsyncPokemonRepository] = MemoryPokemonRepository
+
+
+@app.on_event("startup")
+async def open_database():
+    if STORAGE_BACKEND == "memory":
+        if MEMORY_SNAPSHOT:
+            get_memory_store().load(read_snapshot(MEMORY_SNAPSHOT))
+        return
+
+    db = await database.get_async_database()
+    await indexes.ensure_indexes_async(db)
+
+    # Keywords, so a dependency left out gets noticed instead of shifting the others
+    repository = AsyncPokemonRepository(db=db, cache=get_cache(), replica=get_replica(), moves=get_move_catalog(),
+        learners=get_learners(), names=get_names(), flights=get_flights())
+    await repository.load_moves()
+    await repository.load_learners()
+    await repository.load_names()
+
+    if get_replica() is not None:
+        await repository.load_replica()
+
+
+@app.on_event("shutdown")
+def close_database():
+    database.close()
+
+
+def after_cursor(after):
+    try:
+        return decode_cursor(after) if after is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {after}")
+
+
+def requested_fields(fields, default=None):
+    try:
+        return fields_projection(fields, default)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+async def revalidate(request, repository, id):
+    # Only the version is read for a client that may have the document already,
+    # the others get it in the same query as the body
+    if "if-none-match" not in request.headers:
+        return None
+
+    version = await repository.version(id)
+
+    return not_modified(request, version) if version is not None else None
+
+
+async def batch(ids, fields, repository, headers=None):
+    pokemons = await repository.list_many(ids, requested_fields(fields, {"moveset": False}))
+
+    return FastJSONResponse({"pokemons": [{"id": id, "status": "found", "pokemon": pokemon} if pokemon is not None
+        else {"id": id, "status": "not_found"} for id, pokemon in zip(ids, pokemons)]}, headers=headers)
 
 
 # Routes
@@ -17,84 +110,296 @@ async def root():
     return {"message": "Salve"}
 
 
+@app.get("/admin/cache")
+async def cache_stats(cache: Cache = Depends(get_cache)):
+    if cache is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/admin/flights")
+async def flights_stats(flights: SingleFlight = Depends(get_flights)):
+    if flights is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **flights.stats()}
+
+
+@app.get("/admin/slow-queries")
+async def list_slow_queries(
+        method: Optional[str] = Query(None, max_length=50),
+        command: Optional[str] = Query(None, max_length=50),
+        min_duration_ms: Optional[float] = Query(None, ge=0),
+        limit: Optional[int] = Query(50, gt=0, le=MAX_PAGE_SIZE),
+        slow_queries: SlowQueryLog = Depends(get_slow_queries)
+    ):
+
+    if slow_queries is None:
+        return {"enabled": False}
+
+    return {"enabled": True, "threshold_ms": slow_queries.threshold_ms, "explain_rate": slow_queries.explain_rate,
+        "queries": slow_queries.query(method, command, min_duration_ms, limit)}
+
+
+@app.delete("/admin/slow-queries")
+async def clear_slow_queries(slow_queries: SlowQueryLog = Depends(get_slow_queries)):
+    if slow_queries is not None:
+        slow_queries.clear()
+
+    return {"enabled": slow_queries is not None}
+
+
+@app.get("/metrics")
+async def metrics_exposition(
+        metrics: Metrics = Depends(get_metrics),
+        cache: Cache = Depends(get_cache),
+        flights: SingleFlight = Depends(get_flights)
+    ):
+
+    extra = []
+
+    if cache is not None:
+        stats = cache.stats()
+        extra += [
+            ("cache_hits_total", "counter", "Lookups answered by the cache", stats["hits"]),
+            ("cache_misses_total", "counter", "Lookups that went to the database", stats["misses"]),
+            ("cache_evictions_total", "counter", "Entries dropped to keep the cache bounded", stats["evictions"]),
+            ("cache_entries", "gauge", "Entries in the cache", stats["size"]),
+        ]
+
+    if flights is not None:
+        stats = flights.stats()
+        extra += [
+            ("single_flight_leaders_total", "counter", "Lookups that went to the database", stats["leaders"]),
+            ("single_flight_collapsed_total", "counter", "Lookups that joined one in flight", stats["collapsed"]),
+        ]
+
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/pokemons")
-def list_pokemon(
+async def list_pokemon(
+        request: Request,
         skip: Optional[int] = Query(0, ge=0),
-        limit: Optional[int] = Query(10, gt=0),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        limit: Optional[int] = Query(10, gt=0, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, max_length=100),
+        types: List[str] = Query([]),
+        all_types: bool = Query(False),
+        name_prefix: Optional[str] = Query(None, min_length=1, max_length=30),
+        min_moves: Optional[int] = Query(None, ge=0),
+        max_moves: Optional[int] = Query(None, ge=0),
+        min_power: Optional[int] = Query(None, ge=0),
+        sort: str = Query("pokedex_id", regex=f"^-?({'|'.join(SORT_FIELDS)})$"),
+        fields: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
     ):
 
-    pokemons = repository.list_all(skip, limit, {"_id": False, "moveset": False})
+    # Cursors follow the pokedex_id order, other orders are paged with skip
+    if after is not None and sort != "pokedex_id":
+        raise HTTPException(status_code=400, detail="Cursors can only be used when sorting by pokedex_id")
+
+    projection = requested_fields(fields, {"moveset": False})
+
+    # The pokedex_id is always listed, the next cursor is built from it
+    if fields is not None:
+        projection["pokedex_id"] = True
+
+    version = await repository.version()
+    response = not_modified(request, version)
+
+    if response is not None:
+        return response
+
+    filter = PokemonFilter(types, all_types, name_prefix, min_moves, max_moves, min_power)
+    pokemons = await repository.list_all(skip, limit, projection, after=after_cursor(after),
+        filter=filter, sort=sort)
 
     if pokemons is not None:
-        return {"pokemons": pokemons}
+        cursor = next_cursor(pokemons, limit) if sort == "pokedex_id" else None
+        return FastJSONResponse({"pokemons": pokemons, "next_cursor": cursor},
+            headers=cache_headers(etag(request, version)))
     
     raise HTTPException(status_code=404, detail=f"Pokemon not found")
 
 
+@app.get("/pokemons/export")
+async def export_pokemon(
+        type: Optional[str] = Query(None, max_length=30),
+        fields: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+    ):
+
+    pokemons = repository.iter_all(type_filter(type), requested_fields(fields), EXPORT_BATCH_SIZE)
+
+    # One JSON document per line, sent as soon as each batch arrives
+    lines = (orjson.dumps(pokemon, default=default) + b"\n" async for pokemon in pokemons)
+
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@app.get("/pokemons/suggest")
+async def suggest_pokemon(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=30),
+        limit: Optional[int] = Query(10, gt=0, le=100),
+        fuzzy: bool = Query(False),
+        max_distance: Optional[int] = Query(2, ge=1, le=3),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+    ):
+
+    version = generation_version(await repository.names_version())
+    response = not_modified(request, version)
+
+    if response is not None:
+        return response
+
+    return FastJSONResponse({"suggestions": await repository.suggest(q, limit, fuzzy, max_distance)},
+        headers=cache_headers(etag(request, version)))
+
+
+@app.get("/pokemons/batch")
+async def find_pokemon_batch(
+        request: Request,
+        ids: str = Query(..., min_length=1, max_length=2000),
+        fields: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+    ):
+
+    identifiers = [id.strip() for id in ids.split(",") if id.strip()]
+
+    if len(identifiers) > MAX_PAGE_SIZE or any(len(id) > 30 for id in identifiers):
+        raise HTTPException(status_code=400, detail=f"Up to {MAX_PAGE_SIZE} ids of at most 30 characters")
+
+    version = await repository.version()
+    response = not_modified(request, version)
+
+    if response is not None:
+        return response
+
+    return await batch(identifiers, fields, repository, cache_headers(etag(request, version)))
+
+
+@app.post("/pokemons/batch")
+async def find_pokemon_batch_post(
+        ids: conlist(constr(min_length=1, max_length=30), min_items=1, max_items=MAX_PAGE_SIZE) = Body(...),
+        fields: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+    ):
+
+    return await batch(ids, fields, repository)
+
+
 @app.get("/pokemons/{id}")
-def find_pokemon(
+async def find_pokemon(
+        request: Request,
         id: str = Path(..., max_length=30),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        fields: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
     ):
 
-    pokemon = repository.list_one_pokemon(id=id, projection={"_id": False, "moveset": False})
+    projection = requested_fields(fields, {"moveset": False})
+    response = await revalidate(request, repository, id)
+
+    if response is not None:
+        return response
+
+    pokemon, version = await repository.list_one_pokemon(id=id, projection=projection)
 
     if pokemon is None:
         raise HTTPException(status_code=404, detail=f"Pokemon {id} not found")  
     
-    return {"pokemon":pokemon} 
+    return FastJSONResponse({"pokemon": pokemon}, headers=cache_headers(etag(request, version)))
 
 
 @app.get("/pokemons/{id}/moveset")
-def list_moveset(
+async def list_moveset(
+        request: Request,
         id: str = Path(...,max_length=30),
         skip: Optional[int] = Query(0, ge=0),
         limit: Optional[int] = Query(10, gt=0),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
     ):
 
-    pokemon = repository.list_one_pokemon(id=id, projection={"_id": False, "moveset": True})
+    response = await revalidate(request, repository, id)
+
+    if response is not None:
+        return response
+
+    moveset, version = await repository.list_moveset(id=id, skip=skip, limit=limit)
     
-    if pokemon is None:
+    if moveset is None:
         raise HTTPException(status_code=404, detail=f"Pokemon {id} not found")
 
-    moveset = pokemon["moveset"][skip : skip + limit]
-
     if len(moveset) > 0:
-        return {"moveset":moveset}
+        return FastJSONResponse({"moveset": moveset}, headers=cache_headers(etag(request, version)))
         
     raise HTTPException(status_code=404, detail=f"No moves found from pokemon {id}")
 
 
 @app.get("/pokemons/{id}/moveset/{move_id}")
-def find_move(
+async def find_move(
+        request: Request,
         id: str = Path(..., max_length=30),
         move_id: int = Path(...),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
     ):
 
-    pokemon = repository.list_one_pokemon(id=id, projection={"_id": False, "moveset": True})
+    response = await revalidate(request, repository, id)
+
+    if response is not None:
+        return response
+
+    pokemon, version = await repository.find_move(id=id, move_id=move_id)
 
     if pokemon is None:
         raise HTTPException(status_code=404, detail=f"Pokemon {id} not found")
 
-    if len(pokemon["moveset"]) > move_id:
-        result = pokemon["moveset"][move_id]
-        return {"move": result}
+    if pokemon.get("move") is not None:
+        return FastJSONResponse({"move": pokemon["move"]}, headers=cache_headers(etag(request, version)))
         
     raise HTTPException(status_code=404, detail=f"Move {move_id} from pokemon {id} was not found")
 
 
+@app.get("/moves/{name}/learners")
+async def list_learners(
+        request: Request,
+        name: str = Path(..., max_length=30),
+        also: List[str] = Query([]),
+        limit: Optional[int] = Query(10, gt=0, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, max_length=100),
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+    ):
+
+    after = after_cursor(after)
+    version = generation_version(await repository.learners_version())
+    response = not_modified(request, version)
+
+    if response is not None:
+        return response
+
+    learners = await repository.find_learners([name, *also], after, limit)
+
+    if learners is None:
+        raise HTTPException(status_code=404, detail=f"Move {name} not found")
+
+    return FastJSONResponse({"learners": learners, "next_cursor": next_cursor(learners, limit)},
+        headers=cache_headers(etag(request, version)))
+
+
+@app.post("/admin/learners/rebuild")
+async def rebuild_learners(repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)):
+    await repository.load_learners()
+
+    return {"moves": len(repository.learners.learners)}
+
+
 @app.post("/pokemons", response_model=PokemonModel)
-def create_pokemon(
+async def create_pokemon(
         pokemon: PokemonModel = Body(...),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
 ):
-    new_pokemon = jsonable_encoder(pokemon)
-    new_pokemon["name"] = new_pokemon["name"].title()
-    
-    response = repository.add(new_pokemon)
+    response = await repository.add(new_pokemon(pokemon))
 
     if type(response) is type(HTTPException(status_code=400)):
         raise response
@@ -102,16 +407,68 @@ def create_pokemon(
     return response
 
 
+@app.post("/pokemons/bulk")
+async def create_pokemon_bulk(
+        request: Request,
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+):
+    results = []
+
+    async for chunk in chunks(read_items(request)):
+        documents = []
+
+        for index, item in chunk:
+            pokemon, errors = validate(item, PokemonModel)
+
+            if errors is not None:
+                results.append({"index": index, "status": "invalid", "detail": errors})
+            else:
+                documents.append((index, new_pokemon(pokemon)))
+
+        statuses = await repository.add_many([document for _, document in documents])
+
+        for (index, document), status in zip(documents, statuses):
+            results.append({"index": index, "pokedex_id": document["pokedex_id"], "status": status})
+
+    return summary(results)
+
+
+@app.delete("/pokemons/bulk")
+async def delete_pokemon_bulk(
+        request: Request,
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
+):
+    results = []
+
+    async for chunk in chunks(read_items(request)):
+        ids = []
+
+        for index, item in chunk:
+            id, errors = validate(item, PokedexId)
+
+            if errors is not None:
+                results.append({"index": index, "status": "invalid", "detail": errors})
+            else:
+                ids.append((index, id))
+
+        deleted = await repository.remove_many([id for _, id in ids])
+
+        for index, id in ids:
+            results.append({"index": index, "pokedex_id": id, "status": "deleted" if id in deleted else "not_found"})
+
+    return summary(results)
+
+
 @app.put("/pokemons/{id}", response_model=PokemonModel)
-def update_pokemon(
+async def update_pokemon(
         id: int = Path(..., gt=0, le=809),
         pokemon: UpdatePokemonModel = Body(...),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
 ):
     if pokemon.name is not None:
         pokemon.name = pokemon.name.title()
 
-    response = repository.update(pokemon, id)
+    response = await repository.update(pokemon, id)
 
     if type(response) is type(HTTPException(status_code=400)):
         raise response
@@ -120,12 +477,12 @@ def update_pokemon(
 
 
 @app.delete("/pokemons/{id}")
-def delete_pokemon(
+async def delete_pokemon(
         id: int = Path(..., gt=0, le=809),
-        repository: PokemonRepository = Depends(PokemonRepository)
+        repository: AsyncPokemonRepository = Depends(AsyncPokemonRepository)
 ):
 
-    response = repository.remove(id)
+    response = await repository.remove(id)
 
     if type(response) is type(HTTPException(status_code=400)):
         raise response
@@ -0,0 +1,171 @@
+from bisect import bisect_right, insort
+from os import environ
+
+
+# Same order as the indexes used by mongodb to sort
+SORT_KEYS = {
+    "name": lambda pokemon: pokemon["name"].lower(),
+    "moveset_size": lambda pokemon: (len(pokemon.get("moveset") or []), pokemon["pokedex_id"]),
+}
+
+
+def project(document, projection):
+    # Applies the top level inclusion/exclusion projections and moveset slices used by the routes
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+
+    if any(fields.values()):
+        return {k: project_field(document, k, fields[k]) for k in fields if fields[k] and k in document}
+
+    return {k: v for k, v in document.items() if fields.get(k, True)}
+
+
+def project_field(document, field, value):
+    if type(value) is dict:
+        start, length = value["$slice"]
+        return document[field][start : start + length]
+
+    return document[field]
+
+
+def collection_version(count, latest):
+    # Versions only grow, so when the latest version is back to an earlier one every
+    # document written since was removed again: the documents left are a subset of
+    # the earlier ones, and the same count makes them the same documents
+    return f"{count}.{latest}"
+
+
+def evaluable(filter):
+    # Only equality filters are evaluated in memory, anything else needs mongodb
+    return all(type(value) is not dict for value in filter.values())
+
+
+def matches(document, filter):
+    # Array fields match any of their items, like in mongodb
+    for field, value in filter.items():
+        current = document.get(field)
+
+        if current != value and not (type(current) is list and value in current):
+            return False
+
+    return True
+
+
+# Whole pokedex kept in memory, serving every read without touching mongodb.
+# Writes go to mongodb first and are then applied here; each change runs with
+# no await in between, so requests never see a half applied write.
+class PokedexReplica():
+    def __init__(self):
+        self.by_id = {}
+        self.by_name = {}
+        self.ids = []
+        self.versions = {}
+        self.latest = 0
+
+    def load(self, pokemons):
+        # The documents come with their version, kept apart from what the routes return
+        versions = {pokemon["pokedex_id"]: pokemon.get("version", 0) for pokemon in pokemons}
+        pokemons = [{k: v for k, v in pokemon.items() if k != "version"} for pokemon in pokemons]
+
+        by_id = {pokemon["pokedex_id"]: pokemon for pokemon in pokemons}
+        by_name = {pokemon["name"].lower(): pokemon["pokedex_id"] for pokemon in pokemons}
+
+        self.by_id, self.by_name, self.ids = by_id, by_name, sorted(by_id)
+        self.versions, self.latest = versions, max(versions.values(), default=0)
+
+    def get(self, id):
+        if str(id).isdigit():
+            return self.by_id.get(int(id))
+
+        pokedex_id = self.by_name.get(id.lower())
+        return self.by_id.get(pokedex_id) if pokedex_id is not None else None
+
+    def list_all(self, skip, limit, projection, after=None, filter=None, sort="pokedex_id"):
+        start = bisect_right(self.ids, after) if after is not None else 0
+
+        if (filter is None or filter.empty()) and sort == "pokedex_id":
+            ids = self.ids[start + skip : start + skip + limit]
+            return [project(self.by_id[id], projection) for id in ids]
+
+        pokemons = [self.by_id[id] for id in self.ids[start:]]
+
+        if filter is not None:
+            pokemons = [pokemon for pokemon in pokemons if filter.matches(pokemon)]
+
+        if sort.lstrip("-") != "pokedex_id":
+            pokemons.sort(key=SORT_KEYS[sort.lstrip("-")])
+
+        if sort.startswith("-"):
+            pokemons.reverse()
+
+        return [project(pokemon, projection) for pokemon in pokemons[skip : skip + limit]]
+
+    def iter_all(self, filter, projection):
+        if not evaluable(filter):
+            return None
+
+        pokemons = [self.by_id[id] for id in self.ids]
+
+        return (project(pokemon, projection) for pokemon in pokemons if matches(pokemon, filter))
+
+    def version_of(self, id=None):
+        if id is None:
+            return collection_version(len(self.ids), self.latest)
+
+        pokemon = self.get(id)
+        return self.versions.get(pokemon["pokedex_id"], 0) if pokemon is not None else None
+
+    def list_one_pokemon(self, id, projection):
+        pokemon = self.get(id)
+        return project(pokemon, projection) if pokemon is not None else None
+
+    def list_moveset(self, id, skip, limit):
+        pokemon = self.get(id)
+        return (pokemon.get("moveset") or [])[skip : skip + limit] if pokemon is not None else None
+
+    def find_move(self, id, move_id):
+        pokemon = self.get(id)
+
+        if pokemon is None:
+            return None
+
+        moveset = pokemon.get("moveset") or []
+
+        if -len(moveset) <= move_id < len(moveset):
+            return {"move": moveset[move_id]}
+
+        return {}
+
+    def put(self, pokemon, version=0):
+        pokemon = {k: v for k, v in pokemon.items() if k not in ("_id", "version")}
+        previous = self.by_id.get(pokemon["pokedex_id"])
+
+        if previous is not None:
+            self.by_name.pop(previous["name"].lower(), None)
+        else:
+            insort(self.ids, pokemon["pokedex_id"])
+
+        self.by_id[pokemon["pokedex_id"]] = pokemon
+        self.by_name[pokemon["name"].lower()] = pokemon["pokedex_id"]
+        self.versions[pokemon["pokedex_id"]] = version
+        self.latest = max(self.latest, version)
+
+    def remove(self, pokedex_id):
+        pokemon = self.by_id.pop(pokedex_id, None)
+        version = self.versions.pop(pokedex_id, None)
+
+        if version is not None and version == self.latest:
+            self.latest = max(self.versions.values(), default=0)
+
+        if pokemon is not None:
+            self.by_name.pop(pokemon["name"].lower(), None)
+            self.ids.remove(pokedex_id)
+
+
+if environ.get("REPLICA_ENABLED", "false").lower() == "true":
+    replica = PokedexReplica()
+else:
+    replica = None
+
+
+def get_replica():
+    return replica
@@ -0,0 +1,447 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from fastapi import HTTPException, Depends, status
+from fastapi.responses import JSONResponse
+
+from ..cache import MISSING, Cache, get_cache, identifier_key, projection_key, lookup_tags, page_tags, listing_tags
+from ..database import get_async_database
+from ..flights import SingleFlight, get_flights
+from ..learners import LearnersIndex, get_learners
+from ..models import PokemonModel, UpdatePokemonModel
+from ..moves import MoveCatalog, get_move_catalog
+from ..names import NameIndex, get_names
+from ..replica import PokedexReplica, collection_version, get_replica
+from ..responses import FastJSONResponse
+from ..indexes import NAME_COLLATION
+from ..metrics import measured_methods
+from .queries import (PokemonFilter, pokemon_filter, pokemon_collation, page_find, visible, versioned, document_version,
+    identifiers_filter, keyed_projection, requested, moveset_pipeline, move_pipeline, moves_filter,
+    move_ids_filter, numbered_moves, new_document, update_spec, bulk_statuses)
+
+@measured_methods
+class AsyncPokemonRepository():
+    def __init__(self, db: AsyncIOMotorDatabase = Depends(get_async_database),
+            cache: Cache = Depends(get_cache),
+            replica: PokedexReplica = Depends(get_replica),
+            moves: MoveCatalog = Depends(get_move_catalog),
+            learners: LearnersIndex = Depends(get_learners),
+            names: NameIndex = Depends(get_names),
+            flights: SingleFlight = Depends(get_flights)):
+        self.db = db
+        self.cache = cache
+        self.replica = replica
+        self.moves = moves
+        self.learners = learners
+        self.names = names
+        self.flights = flights
+
+    async def load_moves(self):
+        self.moves.load(await self.db['moves'].find({}, projection={"_id": False}).to_list(length=None))
+
+    async def load_replica(self):
+        pokemons = self.db['pokemons'].find({}, projection={"_id": False, "moveset_size": False})
+        pokemons = await pokemons.to_list(length=None)
+        self.replica.load([{**await self._expand(pokemon), "version": document_version(pokemon.get("version"))}
+            for pokemon in pokemons])
+
+    async def load_learners(self):
+        pokemons = self.db['pokemons'].find({}, projection={"_id": False, "pokedex_id": True,
+            "name": True, "moveset": True})
+
+        self.learners.load([await self._expand(pokemon) async for pokemon in pokemons])
+
+    async def find_learners(self, moves, after, limit):
+        if not self.learners.loaded:
+            await self.load_learners()
+
+        return self.learners.find(moves, after, limit)
+
+    async def learners_version(self):
+        if not self.learners.loaded:
+            await self.load_learners()
+
+        return self.learners.generation
+
+    async def load_names(self):
+        pokemons = self.db['pokemons'].find({}, projection={"_id": False, "pokedex_id": True, "name": True})
+
+        self.names.load(await pokemons.to_list(length=None))
+
+    async def suggest(self, prefix, limit, fuzzy=False, max_distance=2):
+        if not self.names.loaded:
+            await self.load_names()
+
+        return self.names.complete(prefix, limit, fuzzy, max_distance)
+
+    async def names_version(self):
+        if not self.names.loaded:
+            await self.load_names()
+
+        return self.names.generation
+
+    async def version(self, id=None):
+        # Version of a pokemon, None when it doesn't exist, or of the whole collection without an id
+        if self.replica is not None:
+            return self.replica.version_of(id)
+
+        if id is None:
+            return await self._cached(("version",), self._collection_version, lambda version: {"version"})
+
+        pokemon = await self._cached(("version", identifier_key(id)), lambda: self._load_version(id),
+            lambda pokemon: lookup_tags(id, pokemon))
+
+        return document_version(pokemon.get("version")) if pokemon is not None else None
+
+    async def list_all(self, skip, limit, projection, after=None, filter=None, sort="pokedex_id"):
+        filter = filter if filter is not None else PokemonFilter()
+
+        if self.replica is not None:
+            return self.replica.list_all(skip, limit, projection, after, filter, sort)
+
+        tags = page_tags if filter.empty() and sort == "pokedex_id" else listing_tags
+
+        return await self._cached(("all", skip, limit, after, filter.key(), sort, projection_key(projection)),
+            lambda: self._load_page(skip, limit, projection, after, filter, sort), tags)
+
+    async def iter_all(self, filter, projection, batch_size=100):
+        pokemons = self.replica.iter_all(filter, projection) if self.replica is not None else None
+
+        if pokemons is not None:
+            for pokemon in pokemons:
+                yield pokemon
+            return
+
+        pokemons = self.db['pokemons'].find(filter, projection=visible(projection),
+            batch_size=batch_size).sort('pokedex_id')
+
+        async for pokemon in pokemons:
+            yield await self._expand(pokemon)
+
+    async def list_one_pokemon(self, id, projection):
+        # These reads return the version of the document with it, (None, None) when it doesn't exist
+        if self.replica is not None:
+            return self.replica.list_one_pokemon(id, projection), self.replica.version_of(id)
+
+        return await self._cached(("one", identifier_key(id), projection_key(projection)),
+            lambda: self._load_one(id, projection),
+            lambda value: lookup_tags(id, value[0]))
+
+    async def list_many(self, ids, projection):
+        # Identifiers missing from the cache are looked up together, results follow the order of 'ids'
+        if self.replica is not None:
+            return [self.replica.list_one_pokemon(id, projection) for id in ids]
+
+        keys = {id: ("one", identifier_key(id), projection_key(projection)) for id in ids}
+        found = {key: self.cache.get(key) if self.cache is not None else MISSING for key in keys.values()}
+        missing = {identifier_key(id) for id, key in keys.items() if found[key] is MISSING}
+
+        if missing:
+            generation = self.cache.generation if self.cache is not None else None
+            documents = await self._load_many(missing, projection)
+
+            for id in missing:
+                document, version = documents.get(id, (None, None))
+                key = ("one", id, projection_key(projection))
+                found[key] = (requested(document, projection) if document is not None else None, version)
+
+                if self.cache is not None and self.cache.generation == generation:
+                    self.cache.set(key, found[key], lookup_tags(id, document))
+
+        return [found[keys[id]][0] for id in ids]
+
+    async def list_moveset(self, id, skip, limit):
+        if self.replica is not None:
+            return self.replica.list_moveset(id, skip, limit), self.replica.version_of(id)
+
+        pokemon, version = await self._cached(("moveset", identifier_key(id), skip, limit),
+            lambda: self._load_moveset(id, skip, limit),
+            lambda value: lookup_tags(id, value[0]))
+
+        if pokemon is None:
+            return None, None
+
+        return pokemon.get("moveset") or [], version
+
+    async def find_move(self, id, move_id):
+        if self.replica is not None:
+            return self.replica.find_move(id, move_id), self.replica.version_of(id)
+
+        return await self._cached(("move", identifier_key(id), move_id),
+            lambda: self._load_move(id, move_id),
+            lambda value: lookup_tags(id, value[0]))
+
+    async def _load_page(self, skip, limit, projection, after, filter, sort):
+        pokemons = self.db['pokemons'].find(**page_find(skip, limit, projection, after, filter, sort,
+            await self._power_moves(filter)))
+
+        return [await self._expand(pokemon) for pokemon in await pokemons.to_list(length=limit)]
+
+    async def _load_one(self, id, projection):
+        return await self._versioned(await self.db['pokemons'].find_one(pokemon_filter(id),
+            projection=versioned(projection), collation=pokemon_collation(id)))
+
+    async def _load_version(self, id):
+        return await self.db['pokemons'].find_one(pokemon_filter(id),
+            projection={"_id": False, "pokedex_id": True, "version": True}, collation=pokemon_collation(id))
+
+    async def _collection_version(self):
+        # Derived from the documents, the writes have no counter to keep up to date
+        latest = await self.db['pokemons'].find({}, projection={"_id": False, "version": True}) \
+            .sort("version", DESCENDING).limit(1).to_list(length=1)
+        count = await self.db['pokemons'].estimated_document_count()
+
+        return collection_version(count, document_version(latest[0].get("version")) if latest else 0)
+
+    async def _written_versions(self, ids):
+        # Only the replica keeps the versions the server stamped on new documents
+        if self.replica is None or not ids:
+            return {}
+
+        pokemons = self.db['pokemons'].find({"pokedex_id": {"$in": ids}},
+            projection={"_id": False, "pokedex_id": True, "version": True})
+
+        return {pokemon["pokedex_id"]: document_version(pokemon.get("version")) async for pokemon in pokemons}
+
+    async def _load_many(self, ids, projection):
+        pokemons = self.db['pokemons'].find(identifiers_filter(ids), projection=versioned(keyed_projection(projection)),
+            collation=NAME_COLLATION)
+        documents = {}
+
+        async for pokemon in pokemons:
+            pokemon, version = await self._versioned(pokemon)
+            documents[pokemon["pokedex_id"]] = documents[pokemon["name"].lower()] = (pokemon, version)
+
+        return documents
+
+    async def _load_moveset(self, id, skip, limit):
+        return await self._versioned(await self._first(moveset_pipeline(id, skip, limit), pokemon_collation(id)))
+
+    async def _load_move(self, id, move_id):
+        pokemon, version = await self._versioned(await self._first(move_pipeline(id, move_id), pokemon_collation(id)))
+
+        if pokemon is None or "move" not in pokemon:
+            return pokemon, version
+
+        moves = await self._expand_moves([pokemon["move"]])
+        return {"move": moves[0]} if moves else {}, version
+
+    async def _power_moves(self, filter):
+        if filter.min_power is None:
+            return []
+
+        return await self.db['moves'].distinct("move_id", {"power": {"$gte": filter.min_power}})
+
+    async def _first(self, pipeline, collation=None):
+        documents = await self.db['pokemons'].aggregate(pipeline, collation=collation).to_list(length=1)
+
+        return documents[0] if documents else None
+
+    async def _cached(self, key, load, tags):
+        # Cached values are shared between requests and must not be modified
+        if self.cache is None:
+            return await self._shared(key, load)
+
+        value = self.cache.get(key)
+
+        if value is MISSING:
+            generation = self.cache.generation
+            value = await self._shared(key, load)
+
+            # Not cached when a write happened during the load, the value may predate it
+            if self.cache.generation == generation:
+                self.cache.set(key, value, tags(value))
+
+        return value
+
+    async def _shared(self, key, load):
+        if self.flights is None:
+            return await load()
+
+        return await self.flights.do(key, load)
+
+    async def _versioned(self, pokemon):
+        # The version is read along with the document, and kept apart from it
+        if pokemon is None:
+            return None, None
+
+        version = document_version(pokemon.pop("version", None))
+        return await self._expand(pokemon), version
+
+    async def _expand(self, pokemon):
+        if pokemon is None or not pokemon.get("moveset"):
+            return pokemon
+
+        return {**pokemon, "moveset": await self._expand_moves(pokemon["moveset"])}
+
+    async def _expand_moves(self, moveset):
+        # Moves created by other processes are fetched the first time they are seen
+        unknown = self.moves.unknown_ids(moveset)
+
+        if unknown:
+            self.moves.load(await self.db['moves'].find(move_ids_filter(unknown)).to_list(length=None))
+
+        return self.moves.expand(moveset)
+
+    async def _learn_moves(self, moves):
+        # Creates the moves missing from the catalog, so movesets can reference them
+        unknown = self.moves.unknown_moves(moves)
+
+        if unknown:
+            self.moves.load(await self.db['moves'].find(moves_filter(unknown)).to_list(length=None))
+            unknown = self.moves.unknown_moves(unknown)
+
+        if not unknown:
+            return
+
+        counter = await self.db['counters'].find_one_and_update({"_id": "moves"},
+            {"$inc": {"seq": len(unknown)}}, upsert=True, return_document=ReturnDocument.AFTER)
+
+        try:
+            await self.db['moves'].insert_many(numbered_moves(unknown, counter["seq"]), ordered=False)
+
+        except BulkWriteError:
+            # Some of them were just created by another request
+            pass
+
+        self.moves.load(await self.db['moves'].find(moves_filter(unknown)).to_list(length=None))
+
+    async def add(self, pokemon: PokemonModel):
+        moveset = pokemon.get("moveset") or []
+        await self._learn_moves(moveset)
+
+        # Duplicates are rejected by the unique pokedex_id and name indexes
+        try:
+            await self.db["pokemons"].insert_one(new_document(pokemon, self.moves))
+
+        except DuplicateKeyError:
+            return HTTPException(status_code=400, detail="Duplicate pokemon")
+
+        except:
+            return HTTPException(status_code=500, detail="Internal Server Error")
+
+        pokemon.pop("_id", None)
+        versions = await self._written_versions([pokemon["pokedex_id"]])
+
+        self._invalidate(("id", pokemon["pokedex_id"]), ("name", identifier_key(pokemon["name"])), "pages", "version")
+        self._replicate(pokemon, versions.get(pokemon["pokedex_id"], 0))
+
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=pokemon)
+
+    async def update(self, pokemon: UpdatePokemonModel, id):
+        pokemon = {k: v for k, v in pokemon.dict().items() if v is not None and v != []}
+
+        if "moveset" in pokemon:
+            await self._learn_moves(pokemon["moveset"])
+
+        try:
+            if pokemon:
+                updated = await self.db["pokemons"].find_one_and_update({"pokedex_id": id},
+                    update_spec(pokemon, self.moves),
+                    projection={'_id': False, "moveset_size": False}, return_document=ReturnDocument.AFTER)
+            else:
+                updated = await self.db["pokemons"].find_one({"pokedex_id": id},
+                    projection={'_id': False, "moveset_size": False})
+
+        except DuplicateKeyError:
+            return HTTPException(status_code=400, detail="Duplicate pokemon")
+
+        except:
+            return HTTPException(status_code=500, detail="Internal Server Error")
+
+        if updated is None:
+            return HTTPException(status_code=404, detail=f"Pokemon {id} not found")
+
+        version = document_version(updated.pop("version", None))
+        updated = await self._expand(updated)
+
+        if "name" in pokemon:
+            self._invalidate(("name", identifier_key(pokemon["name"])))
+        self._invalidate(("id", id), "unbound", "listings", "version")
+        self._replicate(updated, version)
+
+        return updated
+
+    async def add_many(self, pokemons):
+        # Unordered, so a duplicate does not stop the rest of the chunk
+        if not pokemons:
+            return []
+
+        await self._learn_moves([move for pokemon in pokemons for move in pokemon.get("moveset") or []])
+
+        try:
+            await self.db["pokemons"].insert_many([new_document(pokemon, self.moves) for pokemon in pokemons],
+                ordered=False)
+            statuses = bulk_statuses(None, len(pokemons))
+
+        except BulkWriteError as error:
+            statuses = bulk_statuses(error, len(pokemons))
+
+        versions = await self._written_versions([pokemon["pokedex_id"]
+            for pokemon, outcome in zip(pokemons, statuses) if outcome == "created"])
+
+        for pokemon, outcome in zip(pokemons, statuses):
+            pokemon.pop("_id", None)
+
+            if outcome == "created":
+                self._invalidate(("id", pokemon["pokedex_id"]), ("name", identifier_key(pokemon["name"])))
+                self._replicate(pokemon, versions.get(pokemon["pokedex_id"], 0))
+
+        self._invalidate("pages", "version")
+
+        return statuses
+
+    async def remove_many(self, ids):
+        existing = await self.db["pokemons"].distinct("pokedex_id", {"pokedex_id": {"$in": ids}})
+
+        if not existing:
+            return set()
+
+        await self.db["pokemons"].delete_many({"pokedex_id": {"$in": existing}})
+
+        self._invalidate("unbound", "pages", "version", *[("id", id) for id in existing])
+
+        for id in existing:
+            self._unreplicate(id)
+
+        return set(existing)
+
+    async def remove(self, id):
+        delete_result = await self.db["pokemons"].delete_one({"pokedex_id": id})
+
+        if delete_result.deleted_count == 1:
+            self._invalidate(("id", id), "unbound", "pages", "version")
+
+            self._unreplicate(id)
+
+            return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
+
+        return HTTPException(status_code=404, detail=f"Pokemon {id} not found")
+
+    def _invalidate(self, *tags):
+        if self.cache is not None:
+            self.cache.invalidate(*tags)
+
+        if self.flights is not None:
+            self.flights.invalidate()
+
+    def _replicate(self, pokemon, version):
+        # Keeps the in-memory copies in step with a document just written
+        if self.replica is not None:
+            self.replica.put(pokemon, version)
+
+        if self.learners.loaded:
+            self.learners.put(pokemon)
+
+        if self.names.loaded:
+            self.names.put(pokemon)
+
+    def _unreplicate(self, id):
+        if self.replica is not None:
+            self.replica.remove(id)
+
+        if self.learners.loaded:
+            self.learners.remove(id)
+
+        if self.names.loaded:
+            self.names.remove(id)
@@ -0,0 +1,185 @@
+import gzip
+
+import orjson
+from fastapi import HTTPException, Depends, status
+from fastapi.responses import JSONResponse
+
+from ..learners import LearnersIndex
+from ..models import PokemonModel, UpdatePokemonModel
+from ..moves import move_data
+from ..names import NameIndex
+from ..replica import PokedexReplica
+from ..responses import FastJSONResponse
+
+
+def stored(pokemon):
+    # Documents are kept as the mongodb backend returns them, with every move field
+    document = {k: v for k, v in pokemon.items() if k not in ("_id", "version")}
+
+    if "moveset" in document:
+        document["moveset"] = [move_data(move) for move in document["moveset"] or []]
+
+    return document
+
+
+def read_snapshot(path):
+    # Snapshot written by 'script_db.py --snapshot': one pokemon per line, gzipped
+    with gzip.open(path, "rb") as file:
+        return [orjson.loads(line) for line in file if line.strip()]
+
+
+# The whole pokedex in memory, with no database behind it: the documents indexed
+# by pokedex_id and by name, plus the learners and names indexes, all updated by
+# each write. Used by the tests and as the baseline of the benchmarks.
+class MemoryStore():
+    def __init__(self):
+        self.pokemons = PokedexReplica()
+        self.learners = LearnersIndex()
+        self.names = NameIndex()
+        self.load([])
+
+    def load(self, pokemons):
+        pokemons = [stored(pokemon) for pokemon in pokemons]
+
+        # Each write takes the next version, like the timestamps mongodb gives the documents
+        self.sequence = len(pokemons)
+        self.pokemons.load([{**pokemon, "version": version} for version, pokemon in enumerate(pokemons, 1)])
+        self.learners.load(pokemons)
+        self.names.load(pokemons)
+
+    def all(self):
+        return [self.pokemons.by_id[id] for id in self.pokemons.ids]
+
+    def put(self, pokemon):
+        self.sequence += 1
+        self.pokemons.put(pokemon, self.sequence)
+        self.learners.put(pokemon)
+        self.names.put(pokemon)
+
+    def remove(self, pokedex_id):
+        self.pokemons.remove(pokedex_id)
+        self.learners.remove(pokedex_id)
+        self.names.remove(pokedex_id)
+
+    def duplicate(self, pokemon):
+        return pokemon["pokedex_id"] in self.pokemons.by_id or pokemon["name"].lower() in self.pokemons.by_name
+
+
+store = MemoryStore()
+
+
+def get_memory_store():
+    return store
+
+
+# Same methods and results as AsyncPokemonRepository, which it replaces as a
+# dependency override when STORAGE_BACKEND is 'memory'
+class MemoryPokemonRepository():
+    def __init__(self, store: MemoryStore = Depends(get_memory_store)):
+        self.store = store
+        self.learners = store.learners
+        self.names = store.names
+
+    async def load_moves(self):
+        # Movesets are stored with their moves, there is no catalog to load
+        pass
+
+    async def load_replica(self):
+        pass
+
+    async def load_learners(self):
+        self.learners.load(self.store.all())
+
+    async def find_learners(self, moves, after, limit):
+        return self.learners.find(moves, after, limit)
+
+    async def learners_version(self):
+        return self.learners.generation
+
+    async def load_names(self):
+        self.names.load(self.store.all())
+
+    async def suggest(self, prefix, limit, fuzzy=False, max_distance=2):
+        return self.names.complete(prefix, limit, fuzzy, max_distance)
+
+    async def names_version(self):
+        return self.names.generation
+
+    async def version(self, id=None):
+        return self.store.pokemons.version_of(id)
+
+    async def list_all(self, skip, limit, projection, after=None, filter=None, sort="pokedex_id"):
+        return self.store.pokemons.list_all(skip, limit, projection, after, filter, sort)
+
+    async def iter_all(self, filter, projection, batch_size=100):
+        for pokemon in self.store.pokemons.iter_all(filter, projection):
+            yield pokemon
+
+    async def list_one_pokemon(self, id, projection):
+        return self.store.pokemons.list_one_pokemon(id, projection), self.store.pokemons.version_of(id)
+
+    async def list_many(self, ids, projection):
+        return [self.store.pokemons.list_one_pokemon(id, projection) for id in ids]
+
+    async def list_moveset(self, id, skip, limit):
+        return self.store.pokemons.list_moveset(id, skip, limit), self.store.pokemons.version_of(id)
+
+    async def find_move(self, id, move_id):
+        return self.store.pokemons.find_move(id, move_id), self.store.pokemons.version_of(id)
+
+    async def add(self, pokemon: PokemonModel):
+        if self.store.duplicate(pokemon):
+            return HTTPException(status_code=400, detail="Duplicate pokemon")
+
+        pokemon.pop("_id", None)
+        self.store.put(stored(pokemon))
+
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=pokemon)
+
+    async def update(self, pokemon: UpdatePokemonModel, id):
+        pokemon = {k: v for k, v in pokemon.dict().items() if v is not None and v != []}
+        current = self.store.pokemons.by_id.get(id)
+
+        if current is None:
+            return HTTPException(status_code=404, detail=f"Pokemon {id} not found")
+
+        if "name" in pokemon and self.store.pokemons.by_name.get(pokemon["name"].lower(), id) != id:
+            return HTTPException(status_code=400, detail="Duplicate pokemon")
+
+        if not pokemon:
+            return current
+
+        updated = {**current, **stored(pokemon)}
+        self.store.put(updated)
+
+        return updated
+
+    async def add_many(self, pokemons):
+        statuses = []
+
+        for pokemon in pokemons:
+            pokemon.pop("_id", None)
+
+            if self.store.duplicate(pokemon):
+                statuses.append("duplicate")
+            else:
+                self.store.put(stored(pokemon))
+                statuses.append("created")
+
+        return statuses
+
+    async def remove_many(self, ids):
+        existing = {id for id in ids if id in self.store.pokemons.by_id}
+
+        for id in existing:
+            self.store.remove(id)
+
+        return existing
+
+    async def remove(self, id):
+        if id not in self.store.pokemons.by_id:
+            return HTTPException(status_code=404, detail=f"Pokemon {id} not found")
+
+        self.store.remove(id)
+
+        return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content={})
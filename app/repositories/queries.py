@@ -0,0 +1,297 @@
+import re
+
+from bson import Timestamp
+from pymongo import ASCENDING, DESCENDING
+
+from ..indexes import NAME_COLLATION
+from ..models import PokemonModel
+from ..moves import move_data
+
+
+# Query builders shared by the sync and async repositories
+
+# Indexed fields GET /pokemons can be sorted on, '-' in front sorts them in descending order
+SORT_FIELDS = ("pokedex_id", "name", "moveset_size")
+
+MOVESET_SLICE = re.compile(r"moveset\[(\d*):(\d+)\]")
+
+
+def pokemon_filter(id):
+    if str(id).isdigit():
+        return {"pokedex_id": int(id)}
+
+    return {"name": id.title()}
+
+
+def pokemon_collation(id):
+    # Name lookups must use the collation of the name index to be covered by it
+    if str(id).isdigit():
+        return None
+
+    return NAME_COLLATION
+
+
+def page_filter(after):
+    # Keyset pagination, walks the pokedex_id index instead of skipping documents
+    if after is None:
+        return {}
+
+    return {"pokedex_id": {"$gt": after}}
+
+
+def prefix_range(prefix):
+    # Anchored regexes can't use the case-insensitive name index, a range over it can. Under the
+    # collation punctuation sorts before letters, so the bound can't be the next character ("z" -> "{").
+    return {"$gte": prefix, "$lt": prefix + "\uffff"}
+
+
+def visible(projection):
+    # moveset_size is only kept to filter and sort on and version to build ETags,
+    # they never leave the repository
+    if any(value for field, value in projection.items() if field != "_id"):
+        return projection
+
+    return {**projection, "moveset_size": False, "version": False}
+
+
+def versioned(projection):
+    # As visible, but with the version read along with the document
+    projection = visible(projection)
+
+    if any(value for field, value in projection.items() if field != "_id"):
+        return {**projection, "version": True}
+
+    return {field: value for field, value in projection.items() if field != "version"}
+
+
+def document_version(version):
+    # Writes stamp the documents with a server timestamp, kept as one int in the same
+    # order; documents written before that carry a smaller counter, or nothing
+    if isinstance(version, Timestamp):
+        return version.time << 32 | version.inc
+
+    return version or 0
+
+
+def identifiers_filter(ids):
+    # 'ids' are identifier_keys, names are matched like in pokemon_filter and pokemon_collation
+    numbers = [id for id in ids if type(id) is int]
+    names = [id.title() for id in ids if type(id) is str]
+    clauses = []
+
+    if numbers:
+        clauses.append({"pokedex_id": {"$in": numbers}})
+    if names:
+        clauses.append({"name": {"$in": names}})
+
+    return {"$or": clauses}
+
+
+def keyed_projection(projection):
+    # Keeps the fields needed to match documents back to the identifiers they were looked up by
+    if not any(value for field, value in projection.items() if field != "_id"):
+        return projection
+
+    return {**projection, "pokedex_id": True, "name": True}
+
+
+def requested(document, projection):
+    # Drops the fields keyed_projection added
+    if not any(value for field, value in projection.items() if field != "_id"):
+        return document
+
+    return {field: value for field, value in document.items() if projection.get(field)}
+
+
+def sort_spec(sort):
+    field = sort.lstrip("-")
+    direction = DESCENDING if sort.startswith("-") else ASCENDING
+
+    # Ties are broken by pokedex_id, which is part of the moveset_size index
+    if field == "moveset_size":
+        return [(field, direction), ("pokedex_id", direction)]
+
+    return [(field, direction)]
+
+
+# Filters of GET /pokemons. They are translated to queries covered by the indexes,
+# or evaluated straight on the documents by the in-memory replica.
+class PokemonFilter():
+    def __init__(self, types=None, all_types=False, name_prefix=None, min_moves=None, max_moves=None,
+            min_power=None):
+        self.types = [type.title() for type in types or []]
+        self.all_types = all_types
+        self.name_prefix = name_prefix
+        self.min_moves = min_moves
+        self.max_moves = max_moves
+        self.min_power = min_power
+
+    def key(self):
+        return (tuple(self.types), self.all_types, (self.name_prefix or "").lower(), self.min_moves,
+            self.max_moves, self.min_power)
+
+    def empty(self):
+        return not self.types and not self.name_prefix and self.min_moves is None \
+            and self.max_moves is None and self.min_power is None
+
+    def query(self, power_moves=()):
+        # 'power_moves' are the move_ids with at least min_power
+        query = {}
+
+        if self.types:
+            query["types"] = {"$all" if self.all_types else "$in": self.types}
+
+        if self.name_prefix:
+            query["name"] = prefix_range(self.name_prefix)
+
+        if self.min_moves is not None or self.max_moves is not None:
+            query["moveset_size"] = {}
+            if self.min_moves is not None:
+                query["moveset_size"]["$gte"] = self.min_moves
+            if self.max_moves is not None:
+                query["moveset_size"]["$lte"] = self.max_moves
+
+        if self.min_power is not None:
+            query["moveset"] = {"$in": list(power_moves)}
+
+        return query
+
+    def collation(self, sort):
+        if self.name_prefix or sort.lstrip("-") == "name":
+            return NAME_COLLATION
+
+        return None
+
+    def matches(self, pokemon):
+        types = pokemon.get("types") or []
+        moveset = pokemon.get("moveset") or []
+
+        if self.types and not (all if self.all_types else any)(type in types for type in self.types):
+            return False
+
+        if self.name_prefix and not pokemon["name"].lower().startswith(self.name_prefix.lower()):
+            return False
+
+        if self.min_moves is not None and len(moveset) < self.min_moves:
+            return False
+
+        if self.max_moves is not None and len(moveset) > self.max_moves:
+            return False
+
+        if self.min_power is not None and not any(move.get("power") is not None
+                and move["power"] >= self.min_power for move in moveset):
+            return False
+
+        return True
+
+
+def page_find(skip, limit, projection, after, filter, sort, power_moves=()):
+    # Arguments of the find behind GET /pokemons, for both repositories and the index tests
+    return {
+        "filter": {**page_filter(after), **filter.query(power_moves)},
+        "skip": skip,
+        "limit": limit,
+        "projection": visible(projection),
+        "collation": filter.collation(sort),
+        "sort": sort_spec(sort),
+    }
+
+
+def type_filter(type):
+    if type is None:
+        return {}
+
+    return {"types": type.title()}
+
+
+def fields_projection(fields, default=None):
+    # 'fields' is a comma separated list of PokemonModel fields, 'default' when missing.
+    # The moveset can be sliced like a python list, e.g. 'moveset[:5]' or 'moveset[10:20]'.
+    if fields is None:
+        return {"_id": False, **(default or {})}
+
+    projection = {"_id": False}
+
+    for field in fields.split(","):
+        field = field.strip()
+        moveset_slice = MOVESET_SLICE.fullmatch(field)
+
+        if moveset_slice is not None:
+            start, stop = int(moveset_slice.group(1) or 0), int(moveset_slice.group(2))
+
+            if stop <= start:
+                raise ValueError(f"Empty slice {field}")
+
+            projection["moveset"] = {"$slice": [start, stop - start]}
+            continue
+
+        if field not in PokemonModel.__fields__ or field == "id":
+            raise ValueError(f"Unknown field {field}")
+
+        projection[field] = True
+
+    # A slice on its own brings every other field along, like an exclusion
+    if True not in projection.values():
+        projection["pokedex_id"] = True
+
+    return projection
+
+
+def moveset_pipeline(id, skip, limit):
+    # Only the requested page of the moveset leaves the server
+    return [
+        {"$match": pokemon_filter(id)},
+        {"$limit": 1},
+        {"$project": {"_id": False, "moveset": {"$slice": ["$moveset", skip, limit]}, "version": True}},
+    ]
+
+
+def move_pipeline(id, move_id):
+    # 'move' is missing from the result when move_id is out of range
+    return [
+        {"$match": pokemon_filter(id)},
+        {"$limit": 1},
+        {"$project": {"_id": False, "move": {"$arrayElemAt": ["$moveset", move_id]}, "version": True}},
+    ]
+
+
+def moves_filter(moves):
+    return {"$or": [move_data(move) for move in moves]}
+
+
+def move_ids_filter(move_ids):
+    return {"move_id": {"$in": move_ids}}
+
+
+def numbered_moves(moves, seq):
+    # 'seq' is the counter after reserving one id for each move
+    first = seq - len(moves) + 1
+
+    return [{"move_id": first + i, **move} for i, move in enumerate(moves)]
+
+
+def new_document(pokemon, moves):
+    # The server replaces the empty timestamp with the current one, the version of the document
+    moveset = pokemon.get("moveset") or []
+
+    return {**pokemon, "moveset": moves.refs(moveset), "moveset_size": len(moveset), "version": Timestamp(0, 0)}
+
+
+def update_spec(pokemon, moves):
+    # Stamped with the new version in the same write
+    changes = dict(pokemon)
+
+    if "moveset" in changes:
+        changes["moveset"] = moves.refs(changes["moveset"])
+        changes["moveset_size"] = len(changes["moveset"])
+
+    return {"$set": changes, "$currentDate": {"version": {"$type": "timestamp"}}}
+
+
+def bulk_statuses(error, n):
+    statuses = ["created"] * n
+
+    for write_error in error.details["writeErrors"] if error is not None else []:
+        statuses[write_error["index"]] = "duplicate" if write_error["code"] == 11000 else "error"
+
+    return statuses
@@ -0,0 +1,55 @@
+from contextvars import ContextVar
+
+import msgpack
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+
+MSGPACK = "application/msgpack"
+
+# Set by NegotiatedRoute for the request being handled
+wants_msgpack = ContextVar("wants_msgpack", default=False)
+
+
+def default(value):
+    # The '_id' of the models is the only value orjson can't serialize by itself
+    if isinstance(value, ObjectId):
+        return str(value)
+
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+# Serialized with orjson, or with msgpack for the callers that asked for it.
+# Routes return it directly, which also skips the jsonable_encoder walk
+# FastAPI runs on any other return value.
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        if wants_msgpack.get():
+            self.media_type = MSGPACK
+            return msgpack.packb(content, default=default)
+
+        return orjson.dumps(content, default=default)
+
+
+# Lets the responses of its routes follow the Accept header of the request
+class NegotiatedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request):
+            accept = request.headers.get("accept", "")
+            token = wants_msgpack.set(MSGPACK in accept or "application/x-msgpack" in accept)
+
+            try:
+                response = await handler(request)
+            finally:
+                wants_msgpack.reset(token)
+
+            if isinstance(response, FastJSONResponse):
+                response.headers.add_vary_header("Accept")
+
+            return response
+
+        return negotiated_handler
@@ -0,0 +1,162 @@
+import json
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os import environ
+
+from bson import json_util
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from .metrics import operation, reply_documents
+
+
+SLOW_QUERY_LOG_ENABLED = environ.get("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(environ.get("SLOW_QUERY_THRESHOLD_MS", 100))
+SLOW_QUERY_EXPLAIN_RATE = float(environ.get("SLOW_QUERY_EXPLAIN_RATE", 0.1))
+SLOW_QUERY_LOG_SIZE = int(environ.get("SLOW_QUERY_LOG_SIZE", 200))
+
+# Commands sent by the repositories, and the ones the server can explain
+LOGGED = {"find", "getMore", "aggregate", "count", "distinct", "findAndModify", "insert", "update", "delete"}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+
+# Parts of a command kept in its entry
+SHAPE = ("filter", "projection", "sort", "skip", "limit", "pipeline", "collation", "query", "key")
+
+
+def plan_stages(plan):
+    yield plan
+
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def explain_summary(explain):
+    # Pipelines that start with a query explain it in their first stage
+    if "executionStats" not in explain and explain.get("stages"):
+        explain = explain["stages"][0].get("$cursor", {})
+
+    if "executionStats" not in explain:
+        return None
+
+    stats = explain["executionStats"]
+    plan = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+
+    return {
+        "plan": [stage["stage"] for stage in plan if "stage" in stage],
+        "indexes": [stage["indexName"] for stage in plan if "indexName" in stage],
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "time_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def explainable(command):
+    # The command as sent, without the session and the other driver fields
+    return {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+
+
+# Keeps the last commands that took longer than the threshold, with their shape
+# and, for a sample of them, a summary of explain("executionStats") run by a
+# background thread on the same database, so slow reads are not slowed down further.
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms=SLOW_QUERY_THRESHOLD_MS, explain_rate=SLOW_QUERY_EXPLAIN_RATE,
+            size=SLOW_QUERY_LOG_SIZE, explain=None):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.entries = deque(maxlen=size)
+        self.commands = {}
+        self.explain = explain if explain is not None else explain_on_server
+        self.executor = None
+
+    def started(self, event):
+        if event.command_name in LOGGED:
+            self.commands[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event, len(reply_documents(event.reply)))
+
+    def failed(self, event):
+        self._finished(event, None)
+
+    def query(self, method=None, command=None, min_duration_ms=None, limit=50):
+        found = []
+
+        # Copied first, commands finishing on other threads keep adding entries
+        for entry in reversed(list(self.entries)):
+            if method is not None and entry["method"] != method:
+                continue
+            if command is not None and entry["command"] != command:
+                continue
+            if min_duration_ms is not None and entry["duration_ms"] < min_duration_ms:
+                continue
+
+            found.append(entry)
+
+            if len(found) == limit:
+                break
+
+        return found
+
+    def clear(self):
+        self.entries.clear()
+
+    def _finished(self, event, documents):
+        started = self.commands.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+
+        if started is None or duration_ms < self.threshold_ms:
+            return
+
+        database_name, command = started
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "method": operation.get() or "other",
+            "command": event.command_name,
+            "collection": command.get(event.command_name),
+            "duration_ms": duration_ms,
+            "documents": documents,
+            "failed": documents is None,
+            # Relaxed extended JSON, so the entry can be sent as it is
+            **json.loads(json_util.dumps({k: command[k] for k in SHAPE if k in command})),
+            "explain": None,
+        }
+        self.entries.append(entry)
+
+        if event.command_name in EXPLAINABLE and random.random() < self.explain_rate:
+            entry["explain"] = "pending"
+
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+
+            self.executor.submit(self._explain, entry, database_name, explainable(command))
+
+    def _explain(self, entry, database_name, command):
+        try:
+            entry["explain"] = explain_summary(self.explain(database_name, command))
+
+        except PyMongoError as error:
+            entry["explain"] = {"error": str(error)}
+
+
+def explain_on_server(database_name, command):
+    # Imported here, the database module registers this log on its clients
+    from .database import connect
+
+    return connect()[database_name].command({"explain": command, "verbosity": "executionStats"})
+
+
+if SLOW_QUERY_LOG_ENABLED:
+    slow_queries = SlowQueryLog()
+else:
+    slow_queries = None
+
+
+def get_slow_queries():
+    return slow_queries
@@ -0,0 +1,66 @@
+import asyncio
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from app import database
+from app.learners import LearnersIndex
+from app.moves import get_move_catalog
+from app.names import NameIndex
+from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+from app.repositories.memory_pokemon_repository import MemoryPokemonRepository, MemoryStore
+from app.repositories.queries import PokemonFilter
+
+from .bench_replica import synthetic_pokedex
+
+
+# Latency percentiles of the same repository reads on each storage backend. The
+# in-memory backend, on a synthetic pokedex, is the baseline: what is left once
+# the database is taken out. With 'mongo' as the first argument the mongodb
+# backend is measured too, uncached, which needs a running and populated mongodb.
+
+
+READS = [
+    ("find by id", lambda repository, i: repository.list_one_pokemon(str(i), {"_id": False, "moveset": False})),
+    ("find by name", lambda repository, i: repository.list_one_pokemon(f"pokemon{i}",
+        {"_id": False, "moveset": False})),
+    ("list page", lambda repository, i: repository.list_all(0, 10, {"_id": False, "moveset": False}, after=i)),
+    ("filtered page", lambda repository, i: repository.list_all(0, 10, {"_id": False, "moveset": False},
+        filter=PokemonFilter(types=["water"], min_moves=i % 50))),
+    ("moveset page", lambda repository, i: repository.list_moveset(str(i), 0, 10)),
+]
+
+
+async def run(backend, repository, rounds):
+    for name, read in READS:
+        timings = []
+
+        for i in range(rounds):
+            start = time.perf_counter()
+            await read(repository, i % 809 + 1)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2], timings[len(timings) * 99 // 100]
+
+        print(f"{backend:>7} {name:>14}: p50 {p50 * 1e6:9.2f} us  p99 {p99 * 1e6:9.2f} us")
+
+
+async def main(backends):
+    store = MemoryStore()
+    store.load(synthetic_pokedex())
+    await run("memory", MemoryPokemonRepository(store), 20000)
+
+    if "mongo" in backends:
+        db = await database.get_async_database()
+        repository = AsyncPokemonRepository(db=db, cache=None, replica=None, moves=get_move_catalog(),
+            learners=LearnersIndex(), names=NameIndex(), flights=None)
+        await repository.load_moves()
+        await run("mongo", repository, 2000)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(main(sys.argv[1:]))
+    database.close()
@@ -0,0 +1,51 @@
+import sys
+import time
+
+import httpx
+import msgpack
+
+
+# Payload size and end-to-end latency (request, decompression and parsing)
+# of each encoding. Needs the api running and populated, at the url given
+# as the first argument.
+
+
+ENCODINGS = [
+    ("json", {"Accept-Encoding": "identity"}),
+    ("json gzip", {"Accept-Encoding": "gzip"}),
+    ("json br", {"Accept-Encoding": "br"}),
+    ("msgpack", {"Accept": "application/msgpack", "Accept-Encoding": "identity"}),
+    ("msgpack br", {"Accept": "application/msgpack", "Accept-Encoding": "br"}),
+]
+
+PATHS = ["pokemons?limit=1000", "pokemons/1/moveset?limit=1000"]
+
+
+def parse(response):
+    if response.headers["content-type"] == "application/msgpack":
+        return msgpack.unpackb(response.content)
+
+    return response.json()
+
+
+def run(client, path, name, headers, rounds=50):
+    size = 0
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        with client.stream("GET", path, headers=headers) as response:
+            response.read()
+            size = response.num_bytes_downloaded
+            parse(response)
+
+    elapsed = time.perf_counter() - start
+    print(f"{path:>32} {name:>12}: {size:8} bytes {elapsed / rounds * 1000:8.2f} ms/request")
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://0.0.0.0:8008/"
+
+    with httpx.Client(base_url=url) as client:
+        for path in PATHS:
+            for name, headers in ENCODINGS:
+                run(client, path, name, headers)
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from dotenv import load_dotenv
+
+from app import database
+from app.flights import SingleFlight
+from app.learners import get_learners
+from app.moves import get_move_catalog
+from app.names import get_names
+from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+
+
+# Bursts of identical concurrent lookups, as when a pokemon is on the homepage,
+# with and without single-flight. The cache is off, so every burst reaches the
+# database. Needs a running mongodb.
+
+
+async def run(name, flights, bursts=200, size=100):
+    db = await database.get_async_database()
+    repository = AsyncPokemonRepository(db=db, cache=None, replica=None, moves=get_move_catalog(),
+        learners=get_learners(), names=get_names(), flights=flights)
+
+    start = time.perf_counter()
+    for i in range(bursts):
+        await asyncio.gather(*(repository.list_one_pokemon(str(i % 809 + 1), {"_id": False})
+            for _ in range(size)))
+    elapsed = time.perf_counter() - start
+
+    calls = flights.leaders if flights is not None else bursts * size
+    print(f"{name:>20}: {bursts * size / elapsed:10.1f} req/s  {calls:6d} queries ({elapsed:.2f}s)")
+
+
+async def main():
+    await run("one query each", None)
+    await run("single-flight", SingleFlight())
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(main())
+    database.close()
@@ -0,0 +1,45 @@
+import time
+
+from dotenv import load_dotenv
+
+from app import database
+from app.moves import get_move_catalog
+from app.repositories.pokemon_repository import PokemonRepository
+
+
+# Collection sizes and moveset read latency. Run it before and after
+# 'python -m app.migrate_moves' to compare embedded and normalized movesets.
+# Needs a running and populated mongodb.
+
+
+def sizes(db):
+    for collection in ("pokemons", "moves"):
+        stats = db.command("collStats", collection)
+        print(f"{collection:>10}: {stats['count']:6} docs {stats['size'] / 1024:10.1f} KiB "
+            f"(storage {stats['storageSize'] / 1024:.1f} KiB, avg {stats.get('avgObjSize', 0)} bytes)")
+
+
+def run(name, read, ids, rounds=20):
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        for id in ids:
+            read(id)
+
+    elapsed = time.perf_counter() - start
+    print(f"{name:>20}: {elapsed / (rounds * len(ids)) * 1000:8.3f} ms/call")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    db = database.get_database()
+    repository = PokemonRepository(db, get_move_catalog())
+    ids = range(1, 810, 8)
+
+    sizes(db)
+    run("moveset page", lambda id: repository.list_moveset(id, 0, 10), ids)
+    run("whole moveset", lambda id: repository.list_moveset(id, 0, 1000), ids)
+    run("single move", lambda id: repository.find_move(id, 0), ids)
+
+    database.close()
@@ -0,0 +1,71 @@
+import time
+
+import bson
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+from app import database
+from app.moves import get_move_catalog
+from app.repositories.pokemon_repository import PokemonRepository
+
+
+# Compares loading the whole moveset and slicing it in python (old behaviour)
+# against slicing on the server, for the pokemons with the largest movesets.
+# Needs a running and populated mongodb.
+
+
+class ReplySize(monitoring.CommandListener):
+    def __init__(self):
+        self.bytes = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def full_moveset(repository, id, skip, limit):
+    pokemon = repository.list_one_pokemon(id=id, projection={"_id": False, "moveset": True})
+    return pokemon["moveset"][skip : skip + limit]
+
+
+def sliced_moveset(repository, id, skip, limit):
+    return repository.list_moveset(id=id, skip=skip, limit=limit)
+
+
+def run(name, lookup, repository, listener, ids, rounds):
+    listener.bytes = 0
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        for id in ids:
+            lookup(repository, id, 0, 10)
+
+    elapsed = time.perf_counter() - start
+    calls = rounds * len(ids)
+
+    print(f"{name:>15}: {elapsed / calls * 1000:8.3f} ms/call {listener.bytes / calls:10.0f} bytes/call")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    listener = ReplySize()
+    client = MongoClient(database.mongo_url(), event_listeners=[listener])
+    repository = PokemonRepository(client[database.database_name()], get_move_catalog())
+
+    largest = client[database.database_name()]["pokemons"].aggregate([
+        {"$project": {"pokedex_id": True, "size": {"$size": {"$ifNull": ["$moveset", []]}}}},
+        {"$sort": {"size": -1}},
+        {"$limit": 20},
+    ])
+    ids = [pokemon["pokedex_id"] for pokemon in largest]
+
+    run("full moveset", full_moveset, repository, listener, ids, 50)
+    run("server slice", sliced_moveset, repository, listener, ids, 50)
+
+    client.close()
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from app import database
+from app.moves import get_move_catalog
+from app.repositories.pokemon_repository import PokemonRepository
+
+
+# Compares lookups/sec with a new MongoClient per request (old behaviour)
+# against the process-wide pooled client. Needs a running mongodb.
+
+
+def per_request_client(i):
+    client = MongoClient(database.mongo_url())
+    try:
+        repository = PokemonRepository(client["pokedex"], get_move_catalog())
+        return repository.list_one_pokemon(i % 809 + 1, {"_id": False, "moveset": False})
+    finally:
+        client.close()
+
+
+def pooled_client(i):
+    repository = PokemonRepository(database.get_database(), get_move_catalog())
+    return repository.list_one_pokemon(i % 809 + 1, {"_id": False, "moveset": False})
+
+
+def run(name, lookup, requests, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lookup, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>20}: {requests / elapsed:10.1f} req/s ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    requests, workers = 2000, 32
+
+    run("per-request client", per_request_client, requests, workers)
+    run("pooled client", pooled_client, requests, workers)
+
+    database.close()
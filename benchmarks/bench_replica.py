@@ -0,0 +1,44 @@
+import time
+
+from app.replica import PokedexReplica
+
+
+# Latency percentiles of reads served by the in-memory replica, on a synthetic
+# pokedex with the same shape as the real one. Does not need mongodb.
+
+
+def synthetic_pokedex(size=809, moves=100):
+    return [
+        {
+            "name": f"Pokemon{i}",
+            "pokedex_id": i,
+            "types": ["Water", "Flying"],
+            "moveset": [{"name": f"Move{j}", "power": 40, "accuracy": 1.0, "type": "Normal"} for j in range(moves)],
+        }
+        for i in range(1, size + 1)
+    ]
+
+
+def run(name, read, rounds=20000):
+    timings = []
+
+    for i in range(rounds):
+        start = time.perf_counter()
+        read(i % 809 + 1)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[len(timings) * 99 // 100]
+
+    print(f"{name:>20}: p50 {p50 * 1e6:7.2f} us  p99 {p99 * 1e6:7.2f} us")
+
+
+if __name__ == "__main__":
+    replica = PokedexReplica()
+    replica.load(synthetic_pokedex())
+
+    run("find by id", lambda i: replica.list_one_pokemon(str(i), {"_id": False, "moveset": False}))
+    run("find by name", lambda i: replica.list_one_pokemon(f"pokemon{i}", {"_id": False, "moveset": False}))
+    run("list page", lambda i: replica.list_all(0, 10, {"_id": False, "moveset": False}, after=i))
+    run("moveset page", lambda i: replica.list_moveset(str(i), 0, 10))
+    run("single move", lambda i: replica.find_move(str(i), 17))
@@ -0,0 +1,37 @@
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse
+
+
+# Rendering of a 100 pokemons page and a 150 moves moveset: FastAPI's default
+# path (jsonable_encoder and the stdlib json) against the orjson response that
+# the routes return. Doesn't need the database.
+
+
+def page(size=100):
+    return {"pokemons": [{"name": f"Pokemon {i}", "pokedex_id": i, "types": ["Grass", "Poison"]}
+        for i in range(1, size + 1)], "next_cursor": "eyJwb2tlZGV4X2lkIjogMTAwfQ"}
+
+
+def moveset(size=150):
+    return {"moveset": [{"name": f"Move {i}", "power": i % 150, "accuracy": 0.95, "type": "Normal"}
+        for i in range(size)]}
+
+
+def run(name, render, content, rounds=2000):
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        body = render(content)
+
+    elapsed = time.perf_counter() - start
+    print(f"{name:>30}: {elapsed / rounds * 1000000:8.1f} us/response {len(body):7} bytes")
+
+
+if __name__ == "__main__":
+    for payload, content in (("page", page()), ("moveset", moveset())):
+        run(f"{payload} jsonable_encoder + json", lambda content: JSONResponse(jsonable_encoder(content)).body, content)
+        run(f"{payload} orjson", lambda content: FastJSONResponse(content).body, content)
@@ -0,0 +1,49 @@
+import time
+
+from dotenv import load_dotenv
+
+from app import database
+from app.moves import get_move_catalog
+from app.names import NameIndex
+from app.repositories.pokemon_repository import PokemonRepository
+
+
+# Name autocomplete: filtering the whole list of pokemons, like the search box
+# did with 'GET /pokemons?limit=1000', against the in-memory name index.
+# Needs a running and populated mongodb.
+
+
+QUERIES = ["p", "pi", "pik", "char", "bulba", "mew", "zz"]
+TYPOS = ["pikchu", "chrmander", "bulbasuar", "gyrados"]
+
+
+def run(name, suggest, queries, rounds=200):
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        for query in queries:
+            suggest(query)
+
+    elapsed = time.perf_counter() - start
+    print(f"{name:>20}: {elapsed / (rounds * len(queries)) * 1000000:10.1f} us/query")
+
+
+def filter_list(repository, query):
+    pokemons = repository.list_all(0, 1000, {"_id": False, "moveset": False})
+    return [pokemon for pokemon in pokemons if pokemon["name"].lower().startswith(query)][:10]
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    db = database.get_database()
+    repository = PokemonRepository(db, get_move_catalog())
+
+    names = NameIndex()
+    names.load(db["pokemons"].find({}, projection={"_id": False, "pokedex_id": True, "name": True}))
+
+    run("filter whole list", lambda query: filter_list(repository, query), QUERIES, rounds=5)
+    run("prefix index", lambda query: names.suggest(query, 10), QUERIES)
+    run("fuzzy", lambda query: names.fuzzy(query, 10, 2), TYPOS, rounds=20)
+
+    database.close()
@@ -0,0 +1,76 @@
+import time
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+from app import database, indexes
+from app.models import UpdatePokemonModel
+from app.moves import get_move_catalog
+from app.repositories.pokemon_repository import PokemonRepository
+
+
+# Round-trips and latency of each write, comparing the old check-then-act
+# sequence with the single round-trip repository methods. Runs against a
+# separate 'pokedex_bench' database, which is dropped at the end.
+
+
+class CommandCount(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def check_then_add(db, pokemon):
+    if db["pokemons"].find_one({"pokedex_id": pokemon["pokedex_id"]}, {"pokedex_id": True}) is None:
+        db["pokemons"].insert_one(pokemon)
+
+
+def check_then_update(db, pokemon, id):
+    if db["pokemons"].find_one({"pokedex_id": id}, {"pokedex_id": True}) is not None:
+        db["pokemons"].update_one({"pokedex_id": id}, {"$set": pokemon.dict(exclude_none=True)})
+        return db["pokemons"].find_one({"pokedex_id": id}, {"_id": False})
+
+
+def run(name, write, listener, ids):
+    listener.count = 0
+    start = time.perf_counter()
+
+    for id in ids:
+        write(id)
+
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>20}: {listener.count / len(ids):5.1f} round-trips {elapsed / len(ids) * 1000:8.3f} ms/op")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    listener = CommandCount()
+    client = MongoClient(database.mongo_url(), event_listeners=[listener])
+    db = client["pokedex_bench"]
+    repository = PokemonRepository(db, get_move_catalog())
+
+    db["pokemons"].drop()
+    indexes.ensure_indexes(db)
+
+    ids = range(1, 501)
+    update = UpdatePokemonModel(types=["Water"])
+
+    run("check-then-add", lambda i: check_then_add(db, {"name": f"Pokemon{i}", "pokedex_id": i}), listener, ids)
+    db["pokemons"].delete_many({})
+    run("add", lambda i: repository.add({"name": f"Pokemon{i}", "pokedex_id": i}), listener, ids)
+    run("check-then-update", lambda i: check_then_update(db, update, i), listener, ids)
+    run("update", lambda i: repository.update(update, i), listener, ids)
+    run("remove", lambda i: repository.remove(i), listener, ids)
+
+    client.drop_database("pokedex_bench")
+    client.close()
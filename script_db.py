@@ -1,94 +1,396 @@
-import requests
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from hashlib import sha256
+from pathlib import Path
 
+import httpx
+from dotenv import load_dotenv
 
-# This script populates the database with data from another api
 
+# This script populates the database with data from another api.
+# Upstream requests run concurrently, and the pokemons are sent to the bulk
+# route as soon as they are fetched. Progress is kept in a checkpoint file,
+# so an interrupted run can be resumed with '--resume'.
+# Upstream responses are cached on disk and revalidated with ETag/Last-Modified,
+# and '--snapshot' packs the pokemons in a file that '--load-snapshot' inserts
+# straight into mongodb.
 
-def delete_all(max_pokedex_id, my_url):
-    for i in range(1, max_pokedex_id+1):
-        response = requests.delete(my_url + str(i))
 
-        if response.status_code == 204:
-            print(f"Pokemon {i} excluido com sucesso!")
-        else:
-            print(f"Ocorreu um erro ao tentar excluir o pokemon {i}: {response.status_code}")
+def write_atomic(path, content):
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+
+
+# Compressed upstream responses, stored by the hash of their content and
+# indexed by url, with the validators needed to revalidate them
+class ResponseCache():
+    def __init__(self, root):
+        self.root = Path(root)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "index").mkdir(parents=True, exist_ok=True)
 
+    def get(self, url):
+        path = self._index_path(url)
 
-def get_moves(max_move_id, source_url):
-    moves = []
+        if not path.exists():
+            return None
 
-    for i in range(1, max_move_id+1):
-        response = requests.get(f"{source_url}move/{str(i)}")
+        return json.loads(path.read_text())
 
-        if response.status_code != 200:
-            print(f"Nao pegou o ataque {i}: {response.status_code}")
-            continue
+    def read(self, entry):
+        return json.loads(gzip.decompress((self.root / "objects" / entry["object"]).read_bytes()))
 
-        response = response.json()
+    def put(self, url, content, headers):
+        digest = sha256(content).hexdigest()
+        path = self.root / "objects" / digest
 
-        data = {
-            "name": response["name"].title(),
-            "type": response["type"]["name"].title()
+        if not path.exists():
+            write_atomic(path, gzip.compress(content))
+
+        entry = {
+            "url": url,
+            "object": digest,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified")
         }
+        write_atomic(self._index_path(url), json.dumps(entry).encode())
 
-        if type(response["power"]) is int:
-            data["power"] = response["power"]
+    def _index_path(self, url):
+        return self.root / "index" / f"{sha256(url.encode()).hexdigest()}.json"
 
-        if type(response["accuracy"]) is int:
-            data["accuracy"] = response["accuracy"]/100
 
-        moves.append(data)
-        print(f"Ataque {i} armazenado com sucesso!")
+class HttpSource():
+    def __init__(self, base_url, client, cache=None, offline=False):
+        self.base_url = base_url
+        self.client = client
+        self.cache = cache
+        self.offline = offline
+
+    async def get(self, path):
+        url = f"{self.base_url}{path}"
+        entry = self.cache.get(url) if self.cache is not None else None
+
+        if self.offline:
+            return self.cache.read(entry) if entry is not None else None
+
+        headers = {}
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await self.client.get(url, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            return self.cache.read(entry)
+
+        if response.status_code == 404:
+            return None
+
+        response.raise_for_status()
+
+        if self.cache is not None:
+            self.cache.put(url, response.content, response.headers)
+
+        return response.json()
+
+
+# Stands in for the upstream api, mirroring its layout: <root>/move/1.json, <root>/pokemon/1.json
+class DirectorySource():
+    def __init__(self, root):
+        self.root = Path(root)
+
+    async def get(self, path):
+        file = self.root / f"{path.strip('/')}.json"
+
+        if not file.exists():
+            return None
+
+        return json.loads(file.read_text())
+
+
+# Without a path, progress is only kept in memory
+class Checkpoint():
+    def __init__(self, path):
+        self.path = Path(path) if path is not None else None
+        self.moves = {}
+        self.posted = set()
 
-    return moves
+        if self.path is not None and self.path.exists():
+            data = json.loads(self.path.read_text())
+            self.moves = data["moves"]
+            self.posted = set(data["posted"])
 
+    def save(self):
+        # Written to a temporary file first, so a crash never leaves it half written
+        if self.path is not None:
+            write_atomic(self.path, json.dumps({"moves": self.moves, "posted": sorted(self.posted)}).encode())
 
-def post_all(max_pokedex_id, max_move_id, source_url, my_url):
-    moves = get_moves(max_move_id, source_url)
+    def clear(self):
+        self.moves = {}
+        self.posted = set()
 
-    for i in range (1, max_pokedex_id+1):
-        url_pokemon = f"{source_url}pokemon/{str(i)}"
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
 
-        response = requests.get(url_pokemon)
 
-        if response.status_code != 200:
-            print(f"Não achou os dados do pokemon {i}: {response.status_code}")
-            continue
+async def retry(call, description, retries=5, backoff=0.5):
+    for attempt in range(retries):
+        try:
+            return await call()
 
-        response = response.json()
+        except (httpx.HTTPError, ValueError) as error:
+            if attempt == retries - 1:
+                print(f"Desistiu de {description} depois de {retries} tentativas: {error}")
+                return None
 
-        pokemon_moves = []
-        for move in (response["moves"]):
-            move_url = move["move"]["url"]
-            move_id = int(move_url.split('/')[-2])-1
+            await asyncio.sleep(backoff * 2 ** attempt)
 
+
+async def send(client, method, url, **kwargs):
+    # Server errors are retried, any other response is handled by the caller
+    response = await client.request(method, url, **kwargs)
+
+    if response.status_code >= 500:
+        response.raise_for_status()
+
+    return response
+
+
+async def fetch(source, path, semaphore):
+    async with semaphore:
+        return await retry(lambda: source.get(path), path)
+
+
+def parse_move(response):
+    data = {
+        "name": response["name"].title(),
+        "type": response["type"]["name"].title()
+    }
+
+    if type(response["power"]) is int:
+        data["power"] = response["power"]
+
+    if type(response["accuracy"]) is int:
+        data["accuracy"] = response["accuracy"]/100
+
+    return data
+
+
+def parse_pokemon(pokedex_id, response, moves):
+    pokemon_moves = []
+    for move in (response["moves"]):
+        move_id = move["move"]["url"].split('/')[-2]
+
+        if move_id in moves:
             pokemon_moves.append(moves[move_id])
 
+    types = []
+    for pokemon_type in (response["types"]):
+        types.append(pokemon_type["type"]["name"].title())
+
+    return {"name": response["name"].title(),
+            "pokedex_id": pokedex_id,
+            "types": types,
+            "moveset": pokemon_moves}
+
+
+async def delete_all(max_pokedex_id, my_url, client):
+    ids = list(range(1, max_pokedex_id+1))
+    response = await retry(lambda: send(client, "DELETE", f"{my_url}bulk", json=ids), "delete")
+
+    if response is not None and response.status_code == 200:
+        print(f"{response.json().get('deleted', 0)} pokemons excluidos com sucesso!")
+    else:
+        print(f"Ocorreu um erro ao tentar excluir os pokemons: {getattr(response, 'status_code', None)}")
+
+
+async def get_moves(max_move_id, source, semaphore, checkpoint, save_every=50):
+    fetched = 0
+
+    async def get_move(i):
+        nonlocal fetched
+        response = await fetch(source, f"move/{i}", semaphore)
+
+        if response is None:
+            print(f"Nao pegou o ataque {i}")
+            return
 
-        types = []
-        for pokemon_type in (response["types"]):
-            types.append(pokemon_type["type"]["name"].title())
+        checkpoint.moves[str(i)] = parse_move(response)
+        print(f"Ataque {i} armazenado com sucesso!")
+
+        # Saved along the way, so an interrupted run resumes from the moves it already has
+        fetched += 1
+        if fetched % save_every == 0:
+            checkpoint.save()
+
+    missing = [i for i in range(1, max_move_id+1) if str(i) not in checkpoint.moves]
+    await asyncio.gather(*(get_move(i) for i in missing))
+    checkpoint.save()
+
+    return checkpoint.moves
+
+
+async def post_chunk(chunk, my_url, client, checkpoint):
+    body = "".join(json.dumps(pokemon) + "\n" for pokemon in chunk)
+    response = await retry(lambda: send(client, "POST", f"{my_url}bulk", content=body,
+        headers={"Content-Type": "application/x-ndjson"}), "bulk")
 
+    if response is None or response.status_code != 200:
+        print(f"A minha api nao aceitou o lote: {getattr(response, 'status_code', None)}")
+        return
 
-        pokemon = {"name": response["name"].title(),
-                    "pokedex_id": i,
-                    "types": types,
-                    "moveset": pokemon_moves}
-        
-        response = requests.post(my_url, json=pokemon)
+    for result in response.json()["results"]:
+        pokedex_id = chunk[result["index"]]["pokedex_id"]
 
-        if response.status_code == 201:
-            print(f"Pokemon {i} postado com sucesso!")
+        if result["status"] in ("created", "duplicate"):
+            checkpoint.posted.add(pokedex_id)
+            print(f"Pokemon {pokedex_id} postado com sucesso!")
         else:
-            print(f"Puxou os dados de {i}, mas a minha api nao aceitou: {response.status_code}")
+            print(f"Puxou os dados de {pokedex_id}, mas a minha api nao aceitou: {result}")
 
+    checkpoint.save()
 
-if __name__ == "__main__":
-    source_url = "https://pokeapi.co/api/v2/"
-    my_url = "http://0.0.0.0:8008/pokemons/"
 
-    max_pokedex_id = 809
-    max_move_id = 826
+def write_snapshot(path):
+    # Packed snapshot: every pokemon document in a single gzipped NDJSON file
+    file = gzip.open(path, "wt")
+
+    async def sink(chunk):
+        for pokemon in chunk:
+            file.write(json.dumps(pokemon) + "\n")
+            print(f"Pokemon {pokemon['pokedex_id']} salvo no snapshot!")
+
+    return file, sink
+
+
+def load_snapshot(path, chunk_size):
+    from app import database, indexes
+    from app.moves import get_move_catalog
+    from app.repositories.pokemon_repository import PokemonRepository
+
+    with gzip.open(path, "rt") as file:
+        pokemons = [json.loads(line) for line in file if line.strip()]
+
+    db = database.get_database()
+    indexes.ensure_indexes(db)
+    repository = PokemonRepository(db, get_move_catalog())
+
+    repository.remove_many([pokemon["pokedex_id"] for pokemon in pokemons])
+
+    created = 0
+    for start in range(0, len(pokemons), chunk_size):
+        statuses = repository.add_many(pokemons[start : start + chunk_size])
+        created += statuses.count("created")
+
+    print(f"{created} pokemons carregados do snapshot com sucesso!")
+    database.close()
+
+
+async def post_all(max_pokedex_id, max_move_id, source, semaphore, checkpoint, sink, chunk_size=100):
+    moves = await get_moves(max_move_id, source, semaphore, checkpoint)
+    queue = asyncio.Queue(maxsize=chunk_size * 2)
+
+    async def get_pokemon(i):
+        response = await fetch(source, f"pokemon/{i}", semaphore)
+
+        if response is None:
+            print(f"Não achou os dados do pokemon {i}")
+            return
+
+        await queue.put(parse_pokemon(i, response, moves))
 
-    delete_all(max_pokedex_id, my_url)
-    post_all(max_pokedex_id, max_move_id, source_url, my_url)
+    async def send_pokemons():
+        chunk = []
+
+        while True:
+            pokemon = await queue.get()
+
+            if pokemon is not None:
+                chunk.append(pokemon)
+
+            if chunk and (pokemon is None or len(chunk) == chunk_size):
+                await sink(chunk)
+                chunk = []
+
+            if pokemon is None:
+                return
+
+    async def get_pokemons():
+        pending = [i for i in range(1, max_pokedex_id+1) if i not in checkpoint.posted]
+        await asyncio.gather(*(get_pokemon(i) for i in pending))
+
+        await queue.put(None)
+
+    producers = asyncio.ensure_future(get_pokemons())
+
+    # Awaited together, so a failing sink stops the run instead of leaving the
+    # producers blocked on the full queue. The checkpoint keeps every chunk already sent.
+    try:
+        await asyncio.gather(producers, send_pokemons())
+    except BaseException:
+        producers.cancel()
+        raise
+
+
+async def main(args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    cache = ResponseCache(args.cache_dir) if not args.no_cache else None
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        if args.source.startswith("http"):
+            source = HttpSource(args.source, client, cache, args.offline)
+        else:
+            source = DirectorySource(args.source)
+
+        if args.snapshot:
+            file, sink = write_snapshot(args.snapshot)
+
+            with file:
+                await post_all(args.max_pokedex_id, args.max_move_id, source, semaphore,
+                    Checkpoint(None), sink, args.chunk_size)
+            return
+
+        checkpoint = Checkpoint(args.checkpoint)
+
+        if not args.resume:
+            checkpoint.clear()
+            await delete_all(args.max_pokedex_id, args.my_url, client)
+
+        async def sink(chunk):
+            await post_chunk(chunk, args.my_url, client, checkpoint)
+
+        await post_all(args.max_pokedex_id, args.max_move_id, source, semaphore,
+            checkpoint, sink, args.chunk_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="https://pokeapi.co/api/v2/",
+        help="upstream api url, or a directory with the same layout")
+    parser.add_argument("--my-url", default="http://0.0.0.0:8008/pokemons/")
+    parser.add_argument("--max-pokedex-id", type=int, default=809)
+    parser.add_argument("--max-move-id", type=int, default=826)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--checkpoint", default="script_db.checkpoint.json")
+    parser.add_argument("--resume", action="store_true",
+        help="continue an interrupted run instead of starting over")
+    parser.add_argument("--cache-dir", default=".pokeapi_cache")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--offline", action="store_true",
+        help="only use responses already in the cache")
+    parser.add_argument("--snapshot", help="write the pokemons to this file instead of posting them")
+    parser.add_argument("--load-snapshot", help="insert the pokemons of this file straight into mongodb")
+
+    args = parser.parse_args()
+
+    if args.load_snapshot:
+        load_dotenv()
+        load_snapshot(args.load_snapshot, args.chunk_size)
+    else:
+        asyncio.run(main(args))
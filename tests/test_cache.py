@@ -0,0 +1,158 @@
+import asyncio
+from os import environ
+
+import pytest
+
+from app import cache as cache_module
+from app.cache import MISSING, Cache, identifier_key, lookup_tags, page_tags, listing_tags
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_eviction():
+    cache = Cache(max_size=2, ttl=60)
+    cache.set("a", 1, set())
+    cache.set("b", 2, set())
+
+    assert cache.get("a") == 1
+    cache.set("c", 3, set())
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "max_size": 2, "ttl": 60, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_ttl_expiry(clock):
+    cache = Cache(ttl=10)
+    cache.set("a", None, {("id", 1)})
+
+    clock[0] += 10
+    assert cache.get("a") is None
+
+    clock[0] += 0.1
+    assert cache.get("a") is MISSING
+    assert cache.tags == {}
+    assert cache.stats()["misses"] == 1
+
+
+def test_overwrite_replaces_tags():
+    cache = Cache()
+    cache.set("a", 1, {("id", 1)})
+    cache.set("a", 2, {("id", 2)})
+
+    cache.invalidate(("id", 1))
+    assert cache.get("a") == 2
+
+    cache.invalidate(("id", 2))
+    assert cache.get("a") is MISSING
+    assert cache.tags == {}
+
+
+def test_invalidate_by_tag():
+    cache = Cache()
+    cache.set("one", {"pokedex_id": 25}, lookup_tags(25, {"pokedex_id": 25}))
+    cache.set("page", [{"pokedex_id": 25}, {"pokedex_id": 26}], page_tags([{"pokedex_id": 25}, {"pokedex_id": 26}]))
+    cache.set("listing", [{"pokedex_id": 1}], listing_tags([{"pokedex_id": 1}]))
+    cache.set("other", {"pokedex_id": 4}, lookup_tags(4, {"pokedex_id": 4}))
+
+    cache.invalidate(("id", 25))
+    assert cache.get("one") is MISSING
+    assert cache.get("page") is MISSING
+    assert cache.get("listing") == [{"pokedex_id": 1}]
+
+    cache.invalidate("listings", "missing tag")
+    assert cache.get("listing") is MISSING
+    assert cache.get("other") == {"pokedex_id": 4}
+
+
+def test_lookup_tags():
+    assert identifier_key("025") == 25
+    assert identifier_key("Pikachu") == "pikachu"
+
+    assert lookup_tags("25", None) == {("id", 25)}
+    assert lookup_tags("Pikachu", {"pokedex_id": 25}) == {("name", "pikachu"), ("id", 25)}
+    assert lookup_tags("pikachu", None) == {("name", "pikachu")}
+
+    # Looked up by name without the pokedex_id (a moveset), only 'unbound' ties it to updates by id
+    assert lookup_tags("pikachu", {"moveset": []}) == {("name", "pikachu"), "unbound"}
+
+
+def test_name_entries_follow_their_pokemon():
+    cache = Cache()
+    cache.set(("one", "pikachu"), {"pokedex_id": 25}, lookup_tags("pikachu", {"pokedex_id": 25}))
+    cache.set(("moveset", "pikachu"), {"moveset": []}, lookup_tags("pikachu", {"moveset": []}))
+    cache.set(("one", "raichu"), None, lookup_tags("raichu", None))
+
+    # What an update of pokemon 25 renamed to Raichu invalidates
+    cache.invalidate(("name", "raichu"), ("id", 25), "unbound")
+
+    assert cache.get(("one", "pikachu")) is MISSING
+    assert cache.get(("moveset", "pikachu")) is MISSING
+    assert cache.get(("one", "raichu")) is MISSING
+
+
+def test_loads_overlapping_a_write_are_not_cached():
+    from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+
+    cache = Cache()
+    cache.set("page", [], {"pages"})
+
+    # Without single-flight, the generation of the cache alone guards the load
+    repository = AsyncPokemonRepository(db=None, cache=cache, replica=None, moves=None, learners=None, names=None,
+        flights=None)
+
+    async def load_during_write():
+        cache.invalidate(("id", 25))
+        return {"pokedex_id": 25, "name": "Pikachu"}
+
+    async def load():
+        return {"pokedex_id": 25, "name": "Raichu"}
+
+    async def run():
+        assert (await repository._cached(("one", 25), load_during_write, lambda pokemon: {("id", 25)}))["name"] \
+            == "Pikachu"
+        assert cache.get(("one", 25)) is MISSING
+
+        assert (await repository._cached(("one", 25), load, lambda pokemon: {("id", 25)}))["name"] == "Raichu"
+        assert cache.get(("one", 25))["name"] == "Raichu"
+
+    asyncio.run(run())
+    assert cache.get("page") == []
+
+
+@pytest.mark.skipif(environ.get("TEST_STORAGE_BACKEND", "memory") != "mongo", reason="needs mongodb")
+def test_rename_drops_old_name():
+    from app import database
+    from app.learners import LearnersIndex
+    from app.models import UpdatePokemonModel
+    from app.moves import get_move_catalog
+    from app.names import NameIndex
+    from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+
+    cache = Cache()
+    projection = {"_id": False, "moveset": False}
+
+    async def run():
+        repository = AsyncPokemonRepository(db=await database.get_async_database(), cache=cache, replica=None,
+            moves=get_move_catalog(), learners=LearnersIndex(), names=NameIndex(), flights=None)
+        await repository.remove(808)
+        await repository.add({"name": "Oldname", "pokedex_id": 808, "types": [], "moveset": []})
+
+        try:
+            assert (await repository.list_one_pokemon("oldname", projection))[0]["pokedex_id"] == 808
+            assert await repository.update(UpdatePokemonModel(name="Newname"), 808)
+
+            assert await repository.list_one_pokemon("oldname", projection) == (None, None)
+            pokemon, version = await repository.list_one_pokemon("newname", projection)
+            assert pokemon["pokedex_id"] == 808 and version == await repository.version(808)
+
+        finally:
+            await repository.remove(808)
+
+    asyncio.run(run())
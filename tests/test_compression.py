@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+import zlib
+
+import brotli
+import msgpack
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, accepted_encoding
+from app.responses import FastJSONResponse, NegotiatedRoute
+
+
+app = FastAPI(default_response_class=FastJSONResponse)
+app.router.route_class = NegotiatedRoute
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/big")
+async def big():
+    return {"pokemons": [{"name": "Pikachu", "pokedex_id": 25}] * 50}
+
+
+@app.get("/small")
+async def small():
+    return PlainTextResponse("Pikachu")
+
+
+@app.get("/stream")
+async def stream():
+    return StreamingResponse((b"Pikachu\n" for _ in range(100)), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+def raw(path, headers):
+    response = client.get(path, headers=headers, stream=True)
+    return response, response.raw.read(decode_content=False)
+
+
+def test_accepted_encoding():
+    assert accepted_encoding("gzip, deflate, br") == "br"
+    assert accepted_encoding("gzip;q=0.5, br;q=0") == "gzip"
+    assert accepted_encoding("identity") is None
+    assert accepted_encoding("") is None
+
+
+def test_compression():
+    response, body = raw("/big", {"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["content-length"] == str(len(body))
+    assert brotli.decompress(body) == client.get("/big", headers={"Accept-Encoding": "identity"}).content
+
+    response, body = raw("/stream", {"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == b"Pikachu\n" * 100
+
+    response, body = raw("/small", {"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert body == b"Pikachu"
+
+
+def test_streamed_chunks_are_flushed():
+    chunks = [b'{"pokedex_id": %d}\n' % i for i in range(5)]
+
+    async def ndjson(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": True})
+
+        await send({"type": "http.response.body", "body": b""})
+
+    async def run(encoding):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+        await CompressionMiddleware(ndjson)(scope, None, send)
+
+        return [message["body"] for message in sent if message["type"] == "http.response.body"]
+
+    for encoding, decompressor in (("gzip", zlib.decompressobj(16 + zlib.MAX_WBITS)), ("br", brotli.Decompressor())):
+        bodies = asyncio.run(run(encoding))
+        decompress = getattr(decompressor, "decompress", None) or decompressor.process
+
+        # One frame per chunk, each one decodable before the next arrives, then the end of the stream
+        assert len(bodies) == len(chunks) + 1
+        assert [decompress(body) for body in bodies[:-1]] == chunks
+        assert all(bodies)
+
+
+def test_msgpack_negotiation():
+    response = client.get("/big", headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == client.get("/big").json()
+    assert "Accept" in response.headers["vary"]
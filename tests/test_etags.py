@@ -0,0 +1,68 @@
+from bson import Timestamp
+from starlette.requests import Request
+
+from app.etags import etag, not_modified
+from app.replica import PokedexReplica
+from app.repositories.queries import document_version
+
+
+def request(path, query="", if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+        "headers": headers})
+
+
+def test_etag():
+    tag = etag(request("/pokemons/1"), 3)
+
+    assert tag.startswith('"3-')
+    assert tag == etag(request("/pokemons/1"), 3)
+    assert tag != etag(request("/pokemons/1", "fields=name"), 3)
+    assert tag != etag(request("/pokemons/1"), 4)
+
+
+def test_not_modified():
+    tag = etag(request("/pokemons/1"), 3)
+
+    assert not_modified(request("/pokemons/1"), 3) is None
+    assert not_modified(request("/pokemons/1", if_none_match=tag), 4) is None
+    assert not_modified(request("/pokemons/1", if_none_match=tag), 3).status_code == 304
+    assert not_modified(request("/pokemons/1", if_none_match=f'"other", W/{tag}'), 3).status_code == 304
+    assert not_modified(request("/pokemons/1", if_none_match="*"), 3).status_code == 304
+
+    compressed = tag[:-1] + '-br"'
+    response = not_modified(request("/pokemons/1", if_none_match=compressed), 3)
+    assert response.headers["etag"] == compressed
+
+
+def test_replica_versions():
+    replica = PokedexReplica()
+    replica.load([{"pokedex_id": 1, "name": "Bulbasaur", "version": 2},
+        {"pokedex_id": 2, "name": "Ivysaur", "version": 5}])
+    loaded = replica.version_of()
+
+    assert loaded == "2.5"
+    assert replica.version_of("bulbasaur") == 2
+    assert replica.version_of("3") is None
+    assert "version" not in replica.list_all(0, 10, {})[0]
+
+    replica.put({"pokedex_id": 1, "name": "Bulbasaur", "version": 6}, 6)
+    assert replica.version_of("1") == 6
+    assert replica.version_of() == "2.6"
+
+    replica.remove(1)
+    assert replica.version_of() == "1.5"
+    assert replica.version_of("1") is None
+
+    # Created and removed again: the same documents as before, with the same version
+    replica.put({"pokedex_id": 3, "name": "Venusaur"}, 7)
+    replica.remove(3)
+    replica.put({"pokedex_id": 1, "name": "Bulbasaur"}, 8)
+    assert replica.version_of() == "2.8" != loaded
+
+
+def test_document_version():
+    assert document_version(None) == 0
+    assert document_version(7) == 7
+    assert document_version(Timestamp(1700000000, 2)) > document_version(Timestamp(1700000000, 1)) > 7
+    assert document_version(Timestamp(1700000001, 0)) > document_version(Timestamp(1700000000, 99))
@@ -0,0 +1,53 @@
+import asyncio
+
+from app.flights import SingleFlight
+
+
+def test_single_flight_collapses_identical_calls():
+    flights = SingleFlight()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"pokedex_id": 25}
+
+    async def run():
+        return await asyncio.gather(*(flights.do(("one", 25), load) for _ in range(10)),
+            flights.do(("one", 26), load))
+
+    results = asyncio.run(run())
+
+    assert len(loads) == 2
+    assert results[0] is results[9]
+    assert flights.stats() == {"in_flight": 0, "leaders": 2, "collapsed": 9}
+
+
+def test_single_flight_errors_and_writes():
+    flights = SingleFlight()
+    loads = []
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("down")
+
+    async def load():
+        loads.append(1)
+        count = len(loads)
+        await asyncio.sleep(0.01)
+        return count
+
+    async def run():
+        results = await asyncio.gather(flights.do("key", fail), flights.do("key", fail), return_exceptions=True)
+        assert all(type(result) is ValueError for result in results)
+
+        # A lookup started after a write doesn't join the call started before it
+        first = asyncio.ensure_future(flights.do("key", load))
+        await asyncio.sleep(0)
+        flights.invalidate()
+        second = await flights.do("key", load)
+
+        return await first, second
+
+    assert asyncio.run(run()) == (1, 2)
+    assert flights.stats()["in_flight"] == 0
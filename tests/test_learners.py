@@ -0,0 +1,38 @@
+from app.learners import LearnersIndex
+
+
+def pokemon(pokedex_id, name, *moves):
+    return {"pokedex_id": pokedex_id, "name": name, "moveset": [{"name": move} for move in moves]}
+
+
+def test_learners_intersection_and_pagination():
+    index = LearnersIndex()
+    index.load([
+        pokemon(25, "Pikachu", "Thunderbolt", "Quick-Attack"),
+        pokemon(1, "Bulbasaur", "Cut"),
+        pokemon(26, "Raichu", "Thunderbolt", "Quick-Attack", "Cut"),
+        pokemon(81, "Magnemite", "Thunderbolt")
+    ])
+
+    assert [p["pokedex_id"] for p in index.find(["thunderbolt"], None, 10)] == [25, 26, 81]
+    assert [p["pokedex_id"] for p in index.find(["thunderbolt"], 25, 1)] == [26]
+    assert [p["pokedex_id"] for p in index.find(["Thunderbolt", "cut"], None, 10)] == [26]
+    assert index.find(["thunderbolt", "surf"], None, 10) == []
+    assert index.find(["surf"], None, 10) is None
+
+
+def test_learners_incremental_updates():
+    index = LearnersIndex()
+    index.load([pokemon(25, "Pikachu", "Thunderbolt")])
+
+    generation = index.generation
+    index.put(pokemon(26, "Raichu", "Thunderbolt"))
+    index.put(pokemon(25, "Pikachu", "Surf"))
+    assert index.generation > generation
+    assert index.find(["thunderbolt"], None, 10) == [{"pokedex_id": 26, "name": "Raichu"}]
+
+    generation = index.generation
+    index.remove(26)
+    assert index.generation > generation
+    assert index.find(["thunderbolt"], None, 10) is None
+    assert index.find(["surf"], None, 10) == [{"pokedex_id": 25, "name": "Pikachu"}]
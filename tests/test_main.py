@@ -1,8 +1,14 @@
+import json
+from os import environ
+from pathlib import Path
+
 from dotenv import load_dotenv
 
 from fastapi.testclient import TestClient
 
 from app.poke_app import app
+from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+from app.repositories.memory_pokemon_repository import MemoryPokemonRepository, get_memory_store
 
 
 # TODO -> Divide test functions in separate files
@@ -12,6 +18,15 @@ from app.poke_app import app
 load_dotenv("/usr/src/poke_api/.env")
 
 
+# The tests run on the in-memory backend, loaded with the first pokemons of the pokedex.
+# TEST_STORAGE_BACKEND=mongo runs them on the database filled by script_db.py instead.
+TEST_STORAGE_BACKEND = environ.get("TEST_STORAGE_BACKEND", "memory")
+
+if TEST_STORAGE_BACKEND == "memory":
+    app.dependency_overrides[AsyncPokemonRepository] = MemoryPokemonRepository
+    get_memory_store().load(json.loads((Path(__file__).parent / "data" / "pokedex.json").read_text()))
+
+
 client = TestClient(app)
 
 
@@ -514,6 +529,169 @@ def test_create_pokemon():
     assert response.json()['name'] == 'Bulbasaur'
 
 
+def test_export_pokemon():
+    listed = client.get("/pokemons?limit=1000").json()['pokemons']
+
+    response = client.get("/pokemons/export", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+
+    lines = response.content.decode().splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert [pokemon['pokedex_id'] for pokemon in exported] == [pokemon['pokedex_id'] for pokemon in listed]
+    assert 'moveset' in exported[0]
+
+    response = client.get("/pokemons/export?type=fire&fields=name,types")
+    fire = [json.loads(line) for line in response.content.decode().splitlines()]
+    assert fire and all(set(pokemon) == {'name', 'types'} and 'Fire' in pokemon['types'] for pokemon in fire)
+
+    response = client.get("/pokemons/export?fields=weight")
+    assert response.status_code == 400
+
+    response = client.get("/pokemons/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.content.decode().splitlines() == lines
+
+
+def test_list_pokemon_filtered():
+    response = client.get("/pokemons?types=grass&types=poison&all_types=true&name_prefix=bulb&min_power=40")
+    assert response.status_code == 200
+    assert response.json()['pokemons'][0] == {'name': 'Bulbasaur', 'pokedex_id': 1, 'types': ['Grass', 'Poison']}
+
+    response = client.get("/pokemons?sort=-moveset_size&min_moves=1&limit=2")
+    assert response.status_code == 200
+    assert response.json()['next_cursor'] is None
+
+    response = client.get("/pokemons?sort=weight")
+    assert response.status_code == 422
+
+    response = client.get("/pokemons?sort=name&after=eyJwb2tlZGV4X2lkIjogMX0=")
+    assert response.status_code == 400
+
+
+def test_pokemon_fields():
+    response = client.get("/pokemons/1?fields=name,moveset[:2]")
+    assert response.status_code == 200
+    assert set(response.json()['pokemon']) == {'name', 'moveset'}
+    assert len(response.json()['pokemon']['moveset']) == 2
+
+    response = client.get("/pokemons?fields=name&limit=1")
+    assert response.status_code == 200
+    assert response.json()['pokemons'] == [{'name': 'Bulbasaur', 'pokedex_id': 1}]
+
+    response = client.get("/pokemons/1?fields=weight")
+    assert response.status_code == 400
+
+
+def test_conditional_get():
+    response = client.get("/pokemons/1")
+    assert response.status_code == 200
+    etag = response.headers['etag']
+
+    response = client.get("/pokemons/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert response.content == b''
+
+    response = client.get("/pokemons/2", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    response = client.get("/pokemons/1/moveset?limit=2")
+    etag = response.headers['etag']
+    assert client.get("/pokemons/1/moveset?limit=2", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/pokemons/1/moveset/0", headers={"If-None-Match": etag}).status_code == 200
+
+    assert client.get("/pokemons/9999", headers={"If-None-Match": etag}).status_code == 404
+
+
+def test_metrics():
+    client.get("/pokemons/1")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/pokemons/{id}",status="200"}' in response.text
+
+    if TEST_STORAGE_BACKEND == "mongo":
+        assert 'repository_query_duration_seconds_count{method=' in response.text
+
+
+def test_slow_queries():
+    response = client.get("/admin/slow-queries?limit=5")
+    assert response.status_code == 200
+    assert len(response.json()['queries']) <= 5
+
+    response = client.delete("/admin/slow-queries")
+    assert response.status_code == 200
+    assert client.get("/admin/slow-queries?command=find&min_duration_ms=100000").json()['queries'] == []
+
+
+def test_find_pokemon_batch():
+    response = client.get("/pokemons/batch?ids=4,bulbasaur,NotAPokemon&fields=name")
+    assert response.status_code == 200
+    assert response.json()['pokemons'] == [
+        {'id': '4', 'status': 'found', 'pokemon': {'name': 'Charmander'}},
+        {'id': 'bulbasaur', 'status': 'found', 'pokemon': {'name': 'Bulbasaur'}},
+        {'id': 'NotAPokemon', 'status': 'not_found'}
+    ]
+
+    response = client.post("/pokemons/batch", json=["1", 7])
+    assert response.status_code == 200
+    assert [pokemon['pokemon']['pokedex_id'] for pokemon in response.json()['pokemons']] == [1, 7]
+
+    response = client.post("/pokemons/batch", json=[])
+    assert response.status_code == 422
+
+
+def test_suggest_pokemon():
+    response = client.get("/pokemons/suggest?q=bulb")
+    assert response.status_code == 200
+    assert response.json()['suggestions'][0] == {'pokedex_id': 1, 'name': 'Bulbasaur'}
+
+    response = client.get("/pokemons/suggest?q=bulbsaur&fuzzy=true&max_distance=1")
+    assert response.status_code == 200
+    assert response.json()['suggestions'][0] == {'pokedex_id': 1, 'name': 'Bulbasaur'}
+
+
+def test_suggest_etag_follows_the_names():
+    etag = client.get("/pokemons/suggest?q=bulb").headers['etag']
+    assert client.get("/pokemons/suggest?q=bulb", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/pokemons", json={"name": "Bulbasaurito", "pokedex_id": 808})
+    client.delete("/pokemons/808")
+
+    response = client.get("/pokemons/suggest?q=bulb", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+
+def test_list_learners():
+    response = client.get("/moves/razor-wind/learners?also=cut")
+    assert response.status_code == 200
+    assert response.json()['learners'][0] == {'pokedex_id': 1, 'name': 'Bulbasaur'}
+
+    response = client.get("/moves/NotAMove/learners")
+    assert response.status_code == 404
+
+
+def test_create_pokemon_bulk():
+    data = [
+        {"name": "Bulbasaur", "pokedex_id": 1},
+        {"name": "Xy", "pokedex_id": 2}
+    ]
+    response = client.post("/pokemons/bulk", json=data)
+    assert response.status_code == 200
+    assert response.json()['duplicate'] == 1
+    assert response.json()['invalid'] == 1
+    assert [result['status'] for result in response.json()['results']] == ['duplicate', 'invalid']
+
+
+def test_delete_pokemon_bulk_validation():
+    response = client.request("DELETE", "/pokemons/bulk", json=[2000, "Binho"])
+    assert response.status_code == 200
+    assert response.json()['invalid'] == 2
+
+
 # THIS MUST BE SENT TO ANOTHER FILE Ծ_Ծ 
 
 def test_pokemon_not_found():
@@ -560,6 +738,26 @@ def test_skip():
     assert response.json()['pokemons'][0]['pokedex_id'] > 10
 
 
+def test_cursor_walk():
+    everything = [pokemon['pokedex_id'] for pokemon in client.get("/pokemons?limit=1000").json()['pokemons']]
+    walked = []
+    response = client.get("/pokemons?limit=7")
+
+    while True:
+        assert response.status_code == 200
+        walked += [pokemon['pokedex_id'] for pokemon in response.json()['pokemons']]
+
+        if response.json()['next_cursor'] is None:
+            break
+
+        response = client.get(f"/pokemons?limit=7&after={response.json()['next_cursor']}")
+
+    assert walked == everything == sorted(everything)
+
+    response = client.get("/pokemons?after=notacursor")
+    assert response.status_code == 400
+
+
 def test_post_validation():
     data = {
         "name": "NameThatHasMoreThan30CharactersToTestPydanticValidation",
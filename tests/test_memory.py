@@ -0,0 +1,48 @@
+import asyncio
+import inspect
+
+from app.repositories.async_pokemon_repository import AsyncPokemonRepository
+from app.repositories.memory_pokemon_repository import MemoryPokemonRepository, MemoryStore
+from app.repositories.queries import PokemonFilter
+
+
+def public_methods(cls):
+    return {name: list(inspect.signature(function).parameters) for name, function in vars(cls).items()
+        if not name.startswith("_") and inspect.isfunction(function)}
+
+
+def test_backends_share_interface():
+    assert public_methods(MemoryPokemonRepository) == public_methods(AsyncPokemonRepository)
+
+
+def test_memory_repository():
+    store = MemoryStore()
+    store.load([
+        {"name": "Pikachu", "pokedex_id": 25, "types": ["Electric"], "moveset": [{"name": "Thunderbolt", "power": 90}]},
+        {"name": "Bulbasaur", "pokedex_id": 1, "types": ["Grass"], "moveset": []},
+    ])
+    repository = MemoryPokemonRepository(store)
+
+    async def run():
+        assert await repository.version() == "2.2"
+        assert await repository.list_one_pokemon("pikachu", {"_id": False, "moveset": False}) == \
+            ({"name": "Pikachu", "pokedex_id": 25, "types": ["Electric"]}, 1)
+        assert await repository.list_moveset("25", 0, 10) == \
+            ([{"name": "Thunderbolt", "power": 90, "accuracy": None, "type": None}], 1)
+        assert await repository.find_move("mew", 0) == (None, None)
+        assert [p["pokedex_id"] for p in await repository.list_all(0, 10, {}, filter=PokemonFilter(min_power=50))] \
+            == [25]
+
+        assert await repository.add_many([{"name": "Raichu", "pokedex_id": 26, "types": [], "moveset": []},
+            {"name": "PIKACHU", "pokedex_id": 30}]) == ["created", "duplicate"]
+        assert await repository.version("raichu") == 3
+        assert (await repository.add({"name": "Mew", "pokedex_id": 1})).status_code == 400
+        assert await repository.version() == "3.3"
+
+        assert await repository.remove_many([1, 2]) == {1}
+        assert (await repository.remove(1)).status_code == 404
+        assert await repository.version("bulbasaur") is None
+        assert await repository.suggest("b", 10) == []
+        assert await repository.find_learners(["thunderbolt"], None, 10) == [{"pokedex_id": 25, "name": "Pikachu"}]
+
+    asyncio.run(run())
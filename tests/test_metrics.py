@@ -0,0 +1,69 @@
+import asyncio
+import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo.monitoring import CommandSucceededEvent
+
+from app.metrics import Metrics, MetricsMiddleware, QueryListener, measured, LATENCY_BUCKETS, SIZE_BUCKETS
+
+
+def test_metrics_render():
+    metrics = Metrics()
+    metrics.inc("http_requests_total", (("route", '/pokemons/"{id}"'),), 2)
+    metrics.observe("http_request_duration_seconds", (("route", "/pokemons"),), 0.003, LATENCY_BUCKETS)
+    metrics.observe("http_request_duration_seconds", (("route", "/pokemons"),), 10, LATENCY_BUCKETS)
+
+    text = metrics.render([("cache_entries", "gauge", "Entries in the cache", 7)])
+
+    assert 'http_requests_total{route="/pokemons/\\"{id}\\""} 2' in text
+    assert 'http_request_duration_seconds_bucket{route="/pokemons",le="0.0025"} 0' in text
+    assert 'http_request_duration_seconds_bucket{route="/pokemons",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{route="/pokemons",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{route="/pokemons"} 2' in text
+    assert "# TYPE cache_entries gauge\ncache_entries 7\n" in text
+
+
+def test_query_listener():
+    metrics = Metrics()
+    listener = QueryListener(metrics)
+    reply = {"cursor": {"firstBatch": [{"pokedex_id": 25, "name": "Pikachu"}], "id": 0}, "ok": 1}
+
+    @measured
+    async def list_one_pokemon():
+        listener.succeeded(CommandSucceededEvent(datetime.timedelta(milliseconds=2), reply, "find", 1,
+            ("localhost", 27017), 1))
+
+    asyncio.run(list_one_pokemon())
+    listener.succeeded(CommandSucceededEvent(datetime.timedelta(milliseconds=2), {"n": 1, "ok": 1}, "delete", 2,
+        ("localhost", 27017), 2))
+
+    values = metrics.collect()
+    assert values[("repository_documents_total", (("method", "list_one_pokemon"),))] == 1
+    assert values[("repository_decoded_bytes_total", (("method", "list_one_pokemon"),))] == \
+        len(b'[{"pokedex_id":25,"name":"Pikachu"}]')
+    assert values[("repository_query_duration_seconds", (("method", "list_one_pokemon"), ("command", "find")),
+        LATENCY_BUCKETS)][-2:] == [0, 0.002]
+    assert ("repository_query_duration_seconds", (("method", "other"), ("command", "delete")),
+        LATENCY_BUCKETS) in values
+
+
+def test_metrics_middleware():
+    metrics = Metrics()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/pokemons/{id}")
+    async def find_pokemon(id: int):
+        return {"pokedex_id": id}
+
+    client = TestClient(app)
+    client.get("/pokemons/1")
+    client.get("/pokemons/2")
+    client.get("/nothing")
+
+    values = metrics.collect()
+    labels = (("method", "GET"), ("route", "/pokemons/{id}"))
+    assert values[("http_requests_total", labels + (("status", 200),))] == 2
+    assert values[("http_requests_total", (("method", "GET"), ("route", "unmatched"), ("status", 404)))] == 1
+    assert values[("http_response_size_bytes", labels, SIZE_BUCKETS)][-1] == 2 * len(b'{"pokedex_id":1}')
@@ -0,0 +1,28 @@
+from app.moves import MoveCatalog
+
+
+def test_move_catalog_refs_and_expand():
+    catalog = MoveCatalog()
+    catalog.load([
+        {"move_id": 1, "name": "Cut", "power": 50, "accuracy": 0.95, "type": "Normal"},
+        {"move_id": 2, "name": "Growl", "power": None, "accuracy": 1.0, "type": "Normal"}
+    ])
+    moveset = [
+        {"name": "Growl", "power": None, "accuracy": 1.0, "type": "Normal"},
+        {"name": "Cut", "power": 50, "accuracy": 0.95, "type": "Normal"}
+    ]
+
+    assert catalog.unknown_moves(moveset) == []
+    assert catalog.refs(moveset) == [2, 1]
+    assert catalog.expand([2, 1]) == moveset
+
+
+def test_move_catalog_unknown_moves():
+    catalog = MoveCatalog()
+    catalog.load([{"move_id": 1, "name": "Cut", "power": 50, "accuracy": 0.95, "type": "Normal"}])
+
+    assert catalog.unknown_moves([{"name": "Cut", "power": 40}, {"name": "Cut", "power": 40}]) == [
+        {"name": "Cut", "power": 40, "accuracy": None, "type": None}
+    ]
+    assert catalog.unknown_ids([1, 3, 3]) == [3]
+    assert catalog.expand([{"name": "Tackle"}, 3, 1])[0] == {"name": "Tackle"}
@@ -0,0 +1,35 @@
+from app.names import NameIndex
+
+
+def index(*names):
+    names_index = NameIndex()
+    names_index.load([{"pokedex_id": pokedex_id, "name": name} for pokedex_id, name in enumerate(names, 1)])
+
+    return names_index
+
+
+def test_suggest_prefix_and_updates():
+    names = index("Pikachu", "Pidgey", "Pidgeotto", "Raichu")
+
+    assert [p["name"] for p in names.suggest("pid", 10)] == ["Pidgeotto", "Pidgey"]
+    assert [p["name"] for p in names.suggest("PI", 1)] == ["Pidgeotto"]
+    assert names.suggest("zubat", 10) == []
+
+    generation = names.generation
+    names.put({"pokedex_id": 2, "name": "Pichu"})
+    assert names.generation > generation
+
+    generation = names.generation
+    names.remove(3)
+    assert names.generation > generation
+    assert names.suggest("pi", 10) == [{"pokedex_id": 2, "name": "Pichu"}, {"pokedex_id": 1, "name": "Pikachu"}]
+
+
+def test_fuzzy_suggestions():
+    names = index("Pikachu", "Pichu", "Charmander", "Charmeleon", "Bulbasaur")
+
+    assert [p["name"] for p in names.fuzzy("pikchu", 10, 1)] == ["Pichu", "Pikachu"]
+    assert [p["name"] for p in names.fuzzy("chrmander", 10, 2)] == ["Charmander"]
+    assert [p["name"] for p in names.fuzzy("charmx", 10, 1)] == ["Charmander", "Charmeleon"]
+    assert [p["name"] for p in names.fuzzy("bulbsaur", 10, 1)] == ["Bulbasaur"]
+    assert names.fuzzy("mewtwo", 10, 1) == []
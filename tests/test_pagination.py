@@ -0,0 +1,33 @@
+from base64 import urlsafe_b64encode
+
+from app.pagination import encode_cursor, decode_cursor, next_cursor
+
+
+def cursor(data):
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    for pokedex_id in (0, 1, 25, 151, 809, 10 ** 6):
+        assert decode_cursor(encode_cursor(pokedex_id)) == pokedex_id
+
+    assert "=" not in encode_cursor(1)
+
+
+def test_invalid_cursors():
+    invalid = ["", "a", "!!!!", cursor(b"not json"), cursor(b"[1]"), cursor(b'{"id": 1}'),
+        cursor(b'{"pokedex_id": "1"}'), cursor(b'{"pokedex_id": 1.5}'), cursor(b'{"pokedex_id": null}')]
+
+    for value in invalid:
+        try:
+            decode_cursor(value)
+            assert False, value
+        except ValueError:
+            pass
+
+
+def test_next_cursor():
+    pokemons = [{"pokedex_id": 4}, {"pokedex_id": 7}]
+
+    assert next_cursor(pokemons, 3) is None
+    assert decode_cursor(next_cursor(pokemons, 2)) == 7
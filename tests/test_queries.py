@@ -0,0 +1,166 @@
+from os import environ
+
+import pytest
+from dotenv import load_dotenv
+from bson import Timestamp
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+
+from app import database, indexes
+from app.indexes import NAME_COLLATION
+from app.moves import MoveCatalog, get_move_catalog
+from app.replica import PokedexReplica, project
+from app.repositories.pokemon_repository import PokemonRepository
+from app.repositories.queries import (PokemonFilter, bulk_statuses, fields_projection, identifiers_filter,
+    keyed_projection, new_document, numbered_moves, page_find, requested, update_spec)
+
+
+load_dotenv("/usr/src/poke_api/.env")
+
+
+# Every query shape of GET /pokemons, none of them may scan the whole collection
+SHAPES = [
+    (PokemonFilter(), "pokedex_id"),
+    (PokemonFilter(), "-name"),
+    (PokemonFilter(), "moveset_size"),
+    (PokemonFilter(types=["fire"]), "pokedex_id"),
+    (PokemonFilter(types=["fire", "flying"], all_types=True), "-pokedex_id"),
+    (PokemonFilter(name_prefix="pika"), "pokedex_id"),
+    (PokemonFilter(name_prefix="z"), "name"),
+    (PokemonFilter(name_prefix="pika", types=["electric"]), "name"),
+    (PokemonFilter(min_moves=10, max_moves=50), "pokedex_id"),
+    (PokemonFilter(min_moves=10), "-moveset_size"),
+    (PokemonFilter(min_power=100), "pokedex_id"),
+    (PokemonFilter(types=["water"], min_power=100), "name"),
+]
+
+
+def stages(plan):
+    yield plan.get("stage")
+
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from stages(plan[key])
+
+    for child in plan.get("inputStages", []):
+        yield from stages(child)
+
+
+def pokemon(pokedex_id, name, types, *powers):
+    return {"pokedex_id": pokedex_id, "name": name, "types": types,
+        "moveset": [{"name": f"Move {power}", "power": power} for power in powers]}
+
+
+def test_filter_query():
+    filter = PokemonFilter(types=["fire", "flying"], all_types=True, name_prefix="Char", min_moves=1, min_power=90)
+
+    assert filter.query([7, 8]) == {
+        "types": {"$all": ["Fire", "Flying"]},
+        "name": {"$gte": "Char", "$lt": "Char\uffff"},
+        "moveset_size": {"$gte": 1},
+        "moveset": {"$in": [7, 8]}
+    }
+    assert filter.collation("pokedex_id") is not None
+    assert PokemonFilter(name_prefix="z").query() == {"name": {"$gte": "z", "$lt": "z\uffff"}}
+    assert PokemonFilter().query() == {}
+    assert PokemonFilter().collation("-name") is not None
+
+
+def test_filter_replica():
+    replica = PokedexReplica()
+    replica.load([
+        pokemon(4, "Charmander", ["Fire"], 40),
+        pokemon(6, "Charizard", ["Fire", "Flying"], 40, 110),
+        pokemon(25, "Pikachu", ["Electric"], None, 90, 40),
+    ])
+
+    def ids(filter, sort="pokedex_id"):
+        return [p["pokedex_id"] for p in replica.list_all(0, 10, {"_id": False}, None, filter, sort)]
+
+    assert ids(PokemonFilter(types=["fire", "electric"])) == [4, 6, 25]
+    assert ids(PokemonFilter(types=["fire", "flying"], all_types=True)) == [6]
+    assert ids(PokemonFilter(name_prefix="char"), "name") == [6, 4]
+    assert ids(PokemonFilter(min_moves=2, max_moves=2)) == [6]
+    assert ids(PokemonFilter(min_power=90)) == [6, 25]
+    assert ids(PokemonFilter(), "-moveset_size") == [25, 6, 4]
+
+
+def test_page_find():
+    find = page_find(5, 10, {"_id": False, "moveset": False}, 25, PokemonFilter(name_prefix="pi", min_power=90),
+        "-name", [7])
+
+    assert find == {
+        "filter": {"pokedex_id": {"$gt": 25}, "name": {"$gte": "pi", "$lt": "pi\uffff"}, "moveset": {"$in": [7]}},
+        "skip": 5,
+        "limit": 10,
+        "projection": {"_id": False, "moveset": False, "moveset_size": False, "version": False},
+        "collation": NAME_COLLATION,
+        "sort": [("name", DESCENDING)],
+    }
+
+
+def test_fields_projection():
+    assert fields_projection(None, {"moveset": False}) == {"_id": False, "moveset": False}
+    assert fields_projection("name, types") == {"_id": False, "name": True, "types": True}
+    assert fields_projection("name,moveset[10:15]") == {"_id": False, "name": True, "moveset": {"$slice": [10, 5]}}
+    assert fields_projection("moveset[:2]") == {"_id": False, "moveset": {"$slice": [0, 2]}, "pokedex_id": True}
+
+    pokemon = {"name": "Charizard", "pokedex_id": 6, "types": ["Fire"], "moveset": [{"name": str(i)} for i in range(5)]}
+    assert project(pokemon, fields_projection("name,moveset[1:3]")) == {"name": "Charizard",
+        "moveset": [{"name": "1"}, {"name": "2"}]}
+
+
+@pytest.mark.parametrize("fields", ["id", "weight", "moveset[3:3]", "moveset[-1:]"])
+def test_fields_projection_rejects(fields):
+    with pytest.raises(ValueError):
+        fields_projection(fields)
+
+
+def test_identifiers_lookup():
+    assert identifiers_filter([25, "pikachu"]) == {"$or": [{"pokedex_id": {"$in": [25]}}, {"name": {"$in": ["Pikachu"]}}]}
+    assert identifiers_filter(["mew"]) == {"$or": [{"name": {"$in": ["Mew"]}}]}
+
+    projection = fields_projection("types")
+    document = {"name": "Pikachu", "pokedex_id": 25, "types": ["Electric"]}
+
+    assert keyed_projection(projection) == {"_id": False, "types": True, "pokedex_id": True, "name": True}
+    assert requested(document, projection) == {"types": ["Electric"]}
+    assert requested(document, {"_id": False, "moveset": False}) == document
+
+
+def test_write_documents():
+    cut = {"name": "Cut", "power": 50, "accuracy": 0.95, "type": "Normal"}
+    moves = MoveCatalog()
+    moves.load(numbered_moves([cut], 7))
+
+    assert moves.by_id == {7: cut}
+    assert new_document({"name": "Pikachu", "pokedex_id": 25, "moveset": [cut]}, moves) == {"name": "Pikachu",
+        "pokedex_id": 25, "moveset": [7], "moveset_size": 1, "version": Timestamp(0, 0)}
+
+    changes = {"name": "Raichu", "moveset": [cut]}
+    assert update_spec(changes, moves) == {"$set": {"name": "Raichu", "moveset": [7], "moveset_size": 1},
+        "$currentDate": {"version": {"$type": "timestamp"}}}
+    assert changes == {"name": "Raichu", "moveset": [cut]}
+
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}, {"index": 2, "code": 121}]})
+    assert bulk_statuses(error, 3) == ["duplicate", "created", "error"]
+    assert bulk_statuses(None, 2) == ["created", "created"]
+
+
+@pytest.mark.skipif(environ.get("TEST_STORAGE_BACKEND", "memory") != "mongo", reason="needs mongodb")
+def test_queries_use_indexes():
+    db = database.get_database()
+    indexes.ensure_indexes(db)
+    repository = PokemonRepository(db, get_move_catalog())
+
+    for filter, sort in SHAPES:
+        if filter.min_power is not None:
+            # The moves of the min_power filter are looked up before the find
+            explain = db.command("explain", {"distinct": "moves", "key": "move_id",
+                "query": {"power": {"$gte": filter.min_power}}})
+            assert "COLLSCAN" not in set(stages(explain["queryPlanner"]["winningPlan"])), filter.key()
+
+        # The same arguments both repositories pass to find
+        find = page_find(0, 10, {"_id": False}, None, filter, sort, repository._power_moves(filter))
+        explain = db['pokemons'].find(**find).explain()
+        assert "COLLSCAN" not in set(stages(explain["queryPlanner"]["winningPlan"])), (filter.key(), sort)
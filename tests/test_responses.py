@@ -0,0 +1,26 @@
+import json
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse
+
+
+def test_fast_json_response():
+    content = {"pokemon": {"name": "Pikachu", "pokedex_id": 25, "types": ["Electric"],
+        "moveset": [{"name": "Thunderbolt", "power": 90, "accuracy": 1.0, "type": None}]}}
+
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+    assert FastJSONResponse(content).headers["content-type"] == "application/json"
+
+
+def test_fast_json_response_object_id():
+    id = ObjectId()
+
+    assert json.loads(FastJSONResponse({"_id": id}).body) == {"_id": str(id)}
+
+    try:
+        FastJSONResponse({"value": object()})
+        assert False
+    except TypeError:
+        pass
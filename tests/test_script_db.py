@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from script_db import Checkpoint, DirectorySource, HttpSource, ResponseCache, get_moves, parse_pokemon, post_all
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+def test_get_moves_from_directory(tmp_path):
+    write(tmp_path / "source" / "move" / "1.json",
+        {"name": "razor-wind", "type": {"name": "normal"}, "power": 80, "accuracy": 100})
+    write(tmp_path / "source" / "move" / "2.json",
+        {"name": "swords-dance", "type": {"name": "normal"}, "power": None, "accuracy": None})
+
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    moves = asyncio.run(get_moves(3, DirectorySource(tmp_path / "source"), asyncio.Semaphore(2), checkpoint))
+
+    assert moves == {
+        "1": {"name": "Razor-Wind", "type": "Normal", "power": 80, "accuracy": 1.0},
+        "2": {"name": "Swords-Dance", "type": "Normal"}
+    }
+    assert Checkpoint(tmp_path / "checkpoint.json").moves == moves
+
+
+def test_parse_pokemon_skips_missing_moves():
+    response = {
+        "name": "bulbasaur",
+        "types": [{"type": {"name": "grass"}}, {"type": {"name": "poison"}}],
+        "moves": [
+            {"move": {"url": "https://pokeapi.co/api/v2/move/1/"}},
+            {"move": {"url": "https://pokeapi.co/api/v2/move/3/"}}
+        ]
+    }
+    moves = {"1": {"name": "Razor-Wind", "type": "Normal"}}
+
+    assert parse_pokemon(1, response, moves) == {
+        "name": "Bulbasaur",
+        "pokedex_id": 1,
+        "types": ["Grass", "Poison"],
+        "moveset": [{"name": "Razor-Wind", "type": "Normal"}]
+    }
+
+
+def test_http_source_revalidates_cached_responses(tmp_path):
+    requests = []
+
+    def upstream(request):
+        requests.append(request.headers.get("if-none-match"))
+
+        if request.headers.get("if-none-match") == '"1"':
+            return httpx.Response(304)
+
+        return httpx.Response(200, json={"name": "cut"}, headers={"ETag": '"1"'})
+
+    async def get_twice(offline):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(upstream)) as client:
+            source = HttpSource("https://pokeapi.co/api/v2/", client, ResponseCache(tmp_path), offline)
+            return [await source.get("move/15"), await source.get("move/15")]
+
+    assert asyncio.run(get_twice(offline=False)) == [{"name": "cut"}, {"name": "cut"}]
+    assert requests == [None, '"1"']
+
+    assert asyncio.run(get_twice(offline=True)) == [{"name": "cut"}, {"name": "cut"}]
+    assert len(requests) == 2
+
+
+def test_post_all_fails_when_the_sink_fails(tmp_path):
+    write(tmp_path / "source" / "move" / "1.json", {"name": "cut", "type": {"name": "normal"}, "power": 50, "accuracy": 95})
+
+    for i in range(1, 31):
+        write(tmp_path / "source" / "pokemon" / f"{i}.json", {"name": f"pokemon-{i}", "types": [], "moves": []})
+
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    sent = []
+
+    async def sink(chunk):
+        if sent:
+            raise ValueError("unexpected response")
+
+        sent.append(chunk)
+        checkpoint.posted.update(pokemon["pokedex_id"] for pokemon in chunk)
+        checkpoint.save()
+
+    async def run():
+        # Chunks of 2 and a queue of 4, the producers would block on it for good
+        await asyncio.wait_for(post_all(30, 1, DirectorySource(tmp_path / "source"), asyncio.Semaphore(5),
+            checkpoint, sink, chunk_size=2), timeout=5)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+    assert len(sent) == 1
+    assert Checkpoint(tmp_path / "checkpoint.json").posted == {pokemon["pokedex_id"] for pokemon in sent[0]}
+
+
+def test_get_moves_saves_progress(tmp_path):
+    for i in range(1, 6):
+        write(tmp_path / "source" / "move" / f"{i}.json",
+            {"name": f"move-{i}", "type": {"name": "normal"}, "power": None, "accuracy": None})
+
+    class Interrupted(DirectorySource):
+        async def get(self, path):
+            if path == "move/5":
+                raise KeyboardInterrupt
+            return await super().get(path)
+
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(get_moves(5, Interrupted(tmp_path / "source"), asyncio.Semaphore(1), checkpoint, save_every=2))
+
+    assert set(Checkpoint(tmp_path / "checkpoint.json").moves) == {"1", "2", "3", "4"}
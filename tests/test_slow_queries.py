@@ -0,0 +1,73 @@
+import datetime
+import time
+
+from bson import ObjectId
+from pymongo.monitoring import CommandStartedEvent, CommandSucceededEvent
+
+from app.metrics import measured
+from app.slow_queries import SlowQueryLog, explain_summary
+
+
+FIND_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "name"}}}},
+    "executionStats": {"nReturned": 1, "executionTimeMillis": 3, "totalKeysExamined": 1, "totalDocsExamined": 1},
+}
+
+
+def run(log, command, milliseconds, reply, request_id=1):
+    log.started(CommandStartedEvent({**command, "lsid": {"id": ObjectId()}, "$db": "pokedex"}, "pokedex",
+        request_id, ("localhost", 27017), request_id))
+    log.succeeded(CommandSucceededEvent(datetime.timedelta(milliseconds=milliseconds), reply,
+        next(iter(command)), request_id, ("localhost", 27017), request_id))
+
+
+def test_explain_summary():
+    assert explain_summary(FIND_EXPLAIN) == {"plan": ["LIMIT", "FETCH", "IXSCAN"], "indexes": ["name"],
+        "keys_examined": 1, "docs_examined": 1, "returned": 1, "time_ms": 3}
+    assert explain_summary({"stages": [{"$cursor": FIND_EXPLAIN}, {"$project": {}}]})["indexes"] == ["name"]
+    assert explain_summary({"stages": [{"$match": {}}]}) is None
+
+
+def test_slow_query_log():
+    explained = []
+
+    def explain(database_name, command):
+        explained.append((database_name, command))
+        return FIND_EXPLAIN
+
+    log = SlowQueryLog(threshold_ms=50, explain_rate=1, size=2, explain=explain)
+    find = {"find": "pokemons", "filter": {"name": "Pikachu"}, "projection": {"_id": False}, "limit": 1,
+        "collation": {"locale": "en", "strength": 2}}
+    reply = {"cursor": {"firstBatch": [{"name": "Pikachu"}], "id": 0}, "ok": 1}
+
+    @measured
+    def list_one_pokemon():
+        run(log, find, 80, reply)
+
+    run(log, find, 10, reply)
+    assert log.query() == []
+
+    list_one_pokemon()
+    run(log, {"insert": "pokemons", "documents": []}, 60, {"n": 0, "ok": 1}, 2)
+
+    entries = log.query()
+    assert [entry["command"] for entry in entries] == ["insert", "find"]
+    assert log.query(method="list_one_pokemon") == entries[1:]
+    assert log.query(min_duration_ms=70) == entries[1:]
+
+    entry = entries[1]
+    assert entry["duration_ms"] == 80 and entry["documents"] == 1 and entry["collection"] == "pokemons"
+    assert entry["filter"] == {"name": "Pikachu"} and entry["limit"] == 1 and "sort" not in entry
+
+    for _ in range(100):
+        if entry["explain"] != "pending":
+            break
+        time.sleep(0.01)
+
+    assert entry["explain"]["plan"] == ["LIMIT", "FETCH", "IXSCAN"]
+    assert explained[0][0] == "pokedex" and "lsid" not in explained[0][1] and "$db" not in explained[0][1]
+    assert entries[0]["explain"] is None
+
+    run(log, find, 90, reply, 3)
+    assert len(log.query()) == 2